@@ -12,7 +12,7 @@ from globaleaks.state import State
 from globaleaks.rest.apicache import ApiCache
 from globaleaks.transactions import db_schedule_email
 from globaleaks.utils.templating import Templating
-from globaleaks.utils.utility import datetime_now, datetime_null, get_disk_space, is_expired
+from globaleaks.utils.utility import datetime_now, datetime_null, get_disk_space, is_expired, uuid4
 from globaleaks.utils.log import log
 
 ANOMALY_MAP = {
@@ -79,15 +79,63 @@ def generate_admin_alert_mail(session, tid, alert):
 
 
 @transact
-def save_anomalies(session):
-    for tid in State.tenant_state:
-        for anomaly in State.tenant_state[tid].AnomaliesQ:
-            a = models.Anomalies()
-            a.tid = tid
-            a.alarm = anomaly[2]
-            a.date = anomaly[0]
-            a.events = anomaly[1]
-            session.add(a)
+def db_save_anomalies(session, anomalies):
+    if anomalies:
+        session.bulk_insert_mappings(models.Anomalies, anomalies)
+
+
+@inlineCallbacks
+def save_anomalies():
+    """
+    Writes the anomalies registered after the last flush in a single
+    batched insert and moves forward the watermark of each tenant.
+    """
+    anomalies = []
+    watermarks = []
+
+    for tid, tenant_state in State.tenant_state.items():
+        queue = tenant_state.AnomaliesQ
+        for anomaly in queue[tenant_state.anomalies_watermark:]:
+            anomalies.append({
+                'id': uuid4(),
+                'tid': tid,
+                'date': anomaly[0],
+                'events': anomaly[1],
+                'alarm': anomaly[2]
+            })
+
+        watermarks.append((tenant_state, len(queue)))
+
+    yield db_save_anomalies(anomalies)
+
+    for tenant_state, watermark in watermarks:
+        tenant_state.anomalies_watermark = watermark
+
+
+@transact
+def db_prune_anomalies(session, threshold, limit):
+    ids = [x[0] for x in session.query(models.Anomalies.id)
+                                .filter(models.Anomalies.date < threshold)
+                                .limit(limit)]
+
+    if ids:
+        session.query(models.Anomalies).filter(models.Anomalies.id.in_(ids)).delete(synchronize_session=False)
+
+    return len(ids)
+
+
+@inlineCallbacks
+def prune_anomalies(threshold):
+    """
+    Deletes the anomalies older than the threshold in chunks so that
+    each transaction keeps the database locked for a bounded time.
+    """
+    limit = State.settings.anomalies_prune_chunk_size
+
+    while True:
+        count = yield db_prune_anomalies(threshold, limit)
+        if count < limit:
+            break
 
 
 class Alarm(object):
@@ -115,11 +163,7 @@ class Alarm(object):
         """
         self.number_of_anomalies = 0
 
-        self.event_matrix.clear()
-
-        for event in State.tenant_state[tid].RecentEventQ:
-            self.event_matrix.setdefault(event.event_type, 0)
-            self.event_matrix[event.event_type] += 1
+        self.event_matrix = State.tenant_state[tid].EventCounter.window()
 
         for event_name, threshold in ANOMALY_MAP.items():
             if event_name in self.event_matrix:
@@ -3,7 +3,9 @@
 #   *******
 from __future__ import print_function
 import os
+import signal
 import sys
+import time
 import traceback
 
 from twisted.application import service
@@ -15,12 +17,16 @@ from twisted.web.server import Site
 import globaleaks.mocks.twisted_mocks # pylint: disable=W0611
 
 from globaleaks.db import create_db, init_db, update_db, \
-    sync_refresh_memory_variables, sync_clean_untracked_files
+    sync_refresh_memory_variables, clean_untracked_files
 from globaleaks.rest.api import APIResourceWrapper
+from globaleaks.sessions import Sessions
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.process import disable_swap
-from globaleaks.utils.sock import listen_tcp_on_sock, reserve_port_for_ip
+from globaleaks.utils.sock import listen_tcp_on_sock, listen_unix_on_sock, \
+    reserve_port_for_ip, reserve_unix_socket
+from globaleaks.utils.store import open_store
+from globaleaks.utils.token import TokenList
 from globaleaks.utils.utility import fix_file_permissions, drop_privileges
 from globaleaks.utils.log import timedLogFormatter, LogObserver, log
 from globaleaks.workers.supervisor import ProcessSupervisor
@@ -36,6 +42,7 @@ def fail_startup(excep):
 
 class Service(service.Service):
     _shutdown = False
+    _files_reconciled = False
 
     def __init__(self):
         self.state = State
@@ -79,6 +86,16 @@ class Service(service.Service):
                              0o700,
                              0o600)
 
+        # The UNIX socket is created after fixing the permissions of the
+        # working directory so that it keeps its own restrictive mode
+        if Settings.unix_socket:
+            sock, fail = reserve_unix_socket(Settings.unix_socket_path)
+            if fail is not None:
+                log.err("Could not create socket %s (error: %s)", Settings.unix_socket_path, fail)
+            else:
+                os.chown(Settings.unix_socket_path, Settings.uid, Settings.gid)
+                self.state.unix_sock = sock
+
         drop_privileges(Settings.user, Settings.uid, Settings.gid)
 
         reactor.callLater(0, self.deferred_start)
@@ -92,6 +109,8 @@ class Service(service.Service):
 
             self._shutdown = True
             self.state.orm_tp.stop()
+            self.remove_unix_socket()
+            self.write_clean_shutdown_marker()
             d.callback(None)
 
         reactor.callLater(30, _shutdown, None)
@@ -102,6 +121,10 @@ class Service(service.Service):
 
         return d
 
+    def remove_unix_socket(self):
+        if self.state.unix_sock is not None and os.path.exists(Settings.unix_socket_path):
+            os.remove(Settings.unix_socket_path)
+
     def start_jobs(self):
         from globaleaks.jobs import jobs_list, onion_service
         from globaleaks.jobs.base import JobsMonitor
@@ -138,9 +161,12 @@ class Service(service.Service):
             create_db()
             init_db()
 
-        sync_clean_untracked_files()
+        startup_time = time.time()
+
         sync_refresh_memory_variables()
 
+        Sessions.store = TokenList.store = open_store(Settings.store, Settings.store_file_path)
+
         self.state.orm_tp.start()
 
         reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
@@ -148,16 +174,56 @@ class Service(service.Service):
         for sock in self.state.http_socks:
             listen_tcp_on_sock(reactor, sock.fileno(), self.api_factory)
 
+        if self.state.unix_sock is not None:
+            listen_unix_on_sock(reactor, self.state.unix_sock.fileno(), self.api_factory)
+
         self.state.process_supervisor = ProcessSupervisor(self.state.https_socks,
                                                           '127.0.0.1',
-                                                          8082)
+                                                          8082,
+                                                          self.state.unix_sock)
 
         self.state.process_supervisor.maybe_launch_https_workers()
 
+        # SIGHUP replaces the HTTPS workers one at a time
+        signal.signal(signal.SIGHUP, lambda signum, frame: reactor.callFromThread(self.state.process_supervisor.reload))
+
         self.start_jobs()
 
+        self.reconcile_files(startup_time)
+
         self.print_listening_interfaces()
 
+    def reconcile_files(self, threshold):
+        """
+        Removes the attachments not tracked in the database that could have
+        been left by an unclean shutdown. The check is performed in background
+        after the service has started listening and is skipped entirely if
+        the previous shutdown has been clean.
+        """
+        marker = Settings.clean_shutdown_file_path
+
+        if os.path.exists(marker):
+            # Remove the marker immediately so that a crash during this
+            # execution causes the check to be performed on next startup
+            os.remove(marker)
+            self._files_reconciled = True
+            return
+
+        def done(_):
+            self._files_reconciled = True
+
+        clean_untracked_files(threshold).addCallbacks(done, log.exception)
+
+    def write_clean_shutdown_marker(self):
+        if not self._files_reconciled:
+            return
+
+        try:
+            with open(Settings.clean_shutdown_file_path, 'w') as f:
+                f.write(str(int(time.time())))
+        except (IOError, OSError) as excep:
+            log.err("Unable to write the clean shutdown marker: %s", excep)
+
     @defer.inlineCallbacks
     def deferred_start(self):
         try:
@@ -3,10 +3,13 @@
 # ******************
 import os
 import sys
+import time
 import traceback
 import warnings
 
 from sqlalchemy import exc as sa_exc
+from twisted.internet import threads
+from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models, DATABASE_VERSION
 from globaleaks.db.appdata import db_load_default_questionnaires, db_load_default_fields
@@ -17,6 +20,7 @@ from globaleaks.sessions import Session
 from globaleaks.settings import Settings
 from globaleaks.state import State, TenantState
 from globaleaks.utils import security
+from globaleaks.utils.attachments import iter_attachments
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.log import log
 
@@ -94,30 +98,64 @@ def update_db():
 
 def db_get_tracked_files(session):
     """
-    returns a list the basenames of files tracked by InternalFile and ReceiverFile.
+    returns a set of the basenames of files tracked by InternalFile, ReceiverFile and WhistleblowerFile.
     """
-    ifiles = [x[0] for x in session.query(models.InternalFile.filename)]
-    rfiles = [x[0] for x in session.query(models.ReceiverFile.filename)]
-    wbfiles = [x[0] for x in session.query(models.WhistleblowerFile.filename)]
+    tracked_files = set()
 
-    return [files for files in list(set(ifiles + rfiles + wbfiles))]
+    for model in [models.InternalFile, models.ReceiverFile, models.WhistleblowerFile]:
+        tracked_files.update(x[0] for x in session.query(model.filename))
 
+    return tracked_files
 
-@transact_sync
-def sync_clean_untracked_files(session):
+
+@transact
+def get_tracked_files(session):
+    return db_get_tracked_files(session)
+
+
+def remove_untracked_files(tracked_files, threshold, batch_size=1000, delay=0.1):
+    """
+    removes files in Settings.attachments_path that are not tracked
+    and that were last modified before the threshold timestamp.
+
+    The function is intended to be run in a thread while the service is
+    running; files are checked in batches separated by a pause in order
+    to limit the I/O load and the threshold protects files created after
+    the set of tracked files has been loaded.
+    """
+    count = 0
+
+    for filesystem_file, file_to_remove in iter_attachments():
+        count += 1
+        if count % batch_size == 0:
+            time.sleep(delay)
+
+        if filesystem_file in tracked_files:
+            continue
+
+        try:
+            if os.path.getmtime(file_to_remove) >= threshold:
+                continue
+
+            log.debug('Removing untracked file: %s', file_to_remove)
+            security.overwrite_and_remove(file_to_remove)
+        except (IOError, OSError):
+            log.err('Failed to remove untracked file %s', file_to_remove)
+
+    return count
+
+
+@inlineCallbacks
+def clean_untracked_files(threshold):
     """
-    removes files in Settings.attachments_path that are not
-    tracked by InternalFile/ReceiverFile.
+    Performs in background the reconciliation of the files stored in
+    Settings.attachments_path with the files tracked in the database
     """
-    tracked_files = db_get_tracked_files(session)
-    for filesystem_file in os.listdir(Settings.attachments_path):
-        if filesystem_file not in tracked_files:
-            file_to_remove = os.path.join(Settings.attachments_path, filesystem_file)
-            try:
-                log.debug('Removing untracked file: %s', file_to_remove)
-                security.overwrite_and_remove(file_to_remove)
-            except OSError:
-                log.err('Failed to remove untracked file', file_to_remove)
+    tracked_files = yield get_tracked_files()
+
+    count = yield threads.deferToThread(remove_untracked_files, tracked_files, threshold)
+
+    log.debug('Reconciliation of %d attachments completed', count)
 
 
 def db_set_cache_exception_delivery_list(session, tenant_cache):
@@ -0,0 +1,44 @@
+# -*- coding: UTF-8
+from datetime import timedelta
+
+from globaleaks.db.migrations.update import MigrationBase
+from globaleaks.models import Model
+from globaleaks.models.properties import *
+
+
+def get_rollup_start(period, date):
+    date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == u'week':
+        date -= timedelta(days=date.weekday())
+
+    return date
+
+
+class SecureFileDelete_v_44(Model):
+    __tablename__ = 'securefiledelete'
+
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+
+    filepath = Column(UnicodeText, nullable=False)
+
+
+class MigrationScript(MigrationBase):
+    def epilogue(self):
+        rollups = {}
+
+        for stats in self.session_old.query(self.model_from['Stats']):
+            for period in (u'day', u'week'):
+                start = get_rollup_start(period, stats.start)
+                for event, count in stats.summary.items():
+                    key = (stats.tid, period, start, event)
+                    rollups[key] = rollups.get(key, 0) + count
+
+        for (tid, period, start, event), count in rollups.items():
+            self.session_new.add(self.model_to['StatsRollup']({
+                'tid': tid,
+                'period': period,
+                'start': start,
+                'event': event,
+                'count': count
+            }))
@@ -1,34 +1,13 @@
 # -*- coding: utf-8
+from datetime import datetime
 
 from globaleaks.state import State
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
 
 
-# follow the checker, they are executed from handlers/base.py
-# by prepare() and/or flush()
-
-def file_upload_check(uri):
-    # /submission/ + token_id + /file  = 59 bytes
-    return (len(uri) == 59 and uri.endswith(b'/file')) or uri == b'/wbtip/upload'
-
-
-def submission_check(uri):
-    # Precise len checks are needed to match only submission urls and not file ones
-    # that are like /submission/0SjnzrUhuKx89hePh5Tw9eR3D18ftFZVQG6MaiK1Dy/file
-    return uri.startswith(b'/submission') and (len(uri) == 54 or len(uri) == 11)
-
-
-def login_check(uri):
-    return uri == b'/authentication'
-
-
-def message_check(uri):
-    return uri.startswith(b'/wbtip/messages/') or uri.startswith(b'/rtip/messages/')
-
-
-def comment_check(uri):
-    return uri == b'/wbtip/comments' or uri.startswith(b'/rtip/comments')
-
+# follow the checkers, they are executed from handlers/base.py
+# by execution_check() on the events registered for each handler
+# by the APIResourceWrapper (see get_monitored_events)
 
 def failure_status_check(http_code):
     # if code is missing is a failure because an Exception is raise before set
@@ -51,55 +30,58 @@ def updated_status_check(http_code):
 events_monitored = [
     {
         'name': 'failed_logins',
-        'handler_check': login_check,
+        'handlers': ('AuthenticationHandler',),
         'method': 'POST',
         'status_check': failure_status_check,
     },
     {
         'name': 'successful_logins',
-        'handler_check': login_check,
+        'handlers': ('AuthenticationHandler',),
         'method': 'POST',
         'status_check': ok_status_check
     },
     {
         'name': 'started_submissions',
-        'handler_check': submission_check,
+        'handlers': ('TokenCreate',),
         'method': 'POST',
         'status_check': created_status_check
     },
     {
         'name': 'completed_submissions',
-        'handler_check': submission_check,
+        'handlers': ('SubmissionInstance',),
         'method': 'PUT',
         'status_check': updated_status_check
     },
     {
         'name': 'failed_submissions',
-        'handler_check': submission_check,
+        'handlers': ('SubmissionInstance',),
         'method': 'PUT',
         'status_check': failure_status_check
     },
     {
         'name': 'comments',
-        'handler_check': comment_check,
+        'handlers': ('WBTipCommentCollection', 'RTipCommentCollection'),
         'method': 'POST',
         'status_check': created_status_check
     },
     {
         'name': 'messages',
-        'handler_check': message_check,
+        'handlers': ('WBTipMessageCollection', 'ReceiverMsgCollection'),
         'method': 'POST',
         'status_check': created_status_check
     },
     {
         'name': 'files',
-        'handler_check': file_upload_check,
+        'handlers': ('SubmissionAttachment', 'PostSubmissionAttachment'),
         'method': 'POST',
         'status_check': ok_status_check
     }
 ]
 
 
+EPOCH = datetime(1970, 1, 1)
+
+
 class Event(object):
     """
     Every event that is kept in memory, is a temporary object.
@@ -108,28 +90,55 @@ class Event(object):
 
     - Anomaly check is based on those elements.
     - Real-time analysis is based on these, too.
+
+    Events are identified by their creation time in microseconds since the
+    epoch, incremented when needed to keep the ids unique and increasing;
+    the ids remain ordered across restarts and are used by the clients as
+    cursors to fetch only the events registered after the last poll.
     """
+    last_id = 0
+
     def __init__(self, event_obj, request_time):
         self.event_type = event_obj['name']
         self.creation_date = datetime_now()
         self.request_time = round(request_time.total_seconds(), 1)
 
+        delta = self.creation_date - EPOCH
+        self.id = max(Event.last_id + 1, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+        Event.last_id = self.id
+
     def serialize(self):
         return {
+            'id': self.id,
             'event': self.event_type,
             'creation_date': datetime_to_ISO8601(self.creation_date)[:-8],
             'duration': self.request_time
         }
 
 
-def track_handler(handler):
-    tid = handler.request.tid
+def track_event(tid, event_obj, request_time):
+    e = Event(event_obj, request_time)
+    State.tenant_state[tid].EventCounter.increment(e.event_type)
+    State.tenant_state[tid].EventQ.append(e)
+
+
+def get_monitored_events(handler):
+    """
+    Returns the map of the events that could be triggered by each method
+    of a handler class; the map is computed once on registration of the
+    handler so that the tracking of each request is a dictionary lookup.
+    """
+    ret = {}
 
     for event in events_monitored:
-        if event['handler_check'](handler.request.uri) and \
-           event['method'] == handler.request.method and \
-           event['status_check'](handler.request.code):
-            e = Event(event, handler.request.execution_time)
-            State.tenant_state[tid].RecentEventQ.append(e)
-            State.tenant_state[tid].EventQ.append(e)
+        if handler.__name__ in event['handlers'] and hasattr(handler, event['method'].lower()):
+            ret.setdefault(event['method'].encode(), []).append(event)
+
+    return ret
+
+
+def track_handler(handler):
+    for event in handler.monitored_events.get(handler.request.method, ()):
+        if event['status_check'](handler.request.code):
+            track_event(handler.request.tid, event, handler.request.execution_time)
             break
@@ -1,15 +1,45 @@
 # -*- coding: utf-8
 # Implementation of admin statistics handlers
-import operator
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from globaleaks.event import events_monitored
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.models import Stats, Anomalies
+from globaleaks.jobs.statistics import ROLLUP_PERIODS, get_rollup_start
+from globaleaks.models import Stats, StatsRollup, Anomalies
 from globaleaks.orm import transact
+from globaleaks.rest import errors
 from globaleaks.state import State
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, \
-    iso_to_gregorian
+    iso_to_gregorian, ISO8601_to_datetime
+
+
+def parse_cursor(request):
+    """
+    Parses the optional arguments used by the clients to poll incrementally:
+
+    - since: the id of the last entry received or an ISO8601 date with
+      up to microseconds precision
+    - limit: the maximum number of entries returned
+    """
+    since, limit = None, None
+
+    try:
+        if b'since' in request.args:
+            since = request.args[b'since'][0].decode('utf-8')
+            if since.isdigit():
+                since = int(since)
+            else:
+                since = since.rstrip('Z')
+                since = datetime.strptime(since, '%Y-%m-%dT%H:%M:%S.%f' if '.' in since else '%Y-%m-%dT%H:%M:%S')
+
+        if b'limit' in request.args:
+            limit = int(request.args[b'limit'][0])
+            if limit < 1:
+                raise ValueError
+    except ValueError:
+        raise errors.InputValidationError('Invalid cursor')
+
+    return since, limit
 
 
 def weekmap_to_heatmap(week_map):
@@ -109,8 +139,57 @@ def get_stats(session, tid, week_delta):
 
 
 @transact
-def get_anomaly_history(session, tid, limit):
-    anomalies = session.query(Anomalies).filter(Anomalies.tid == tid).order_by(Anomalies.date.desc())[:limit]
+def get_stats_range(session, tid, period, start, end):
+    """
+    Returns the counters of the events aggregated by day or by week
+    for the periods included in the range [start, end].
+
+    The counters are read from the rollups updated hourly by the
+    statistics job and so do not include the events of the current hour.
+    """
+    start = get_rollup_start(period, start)
+
+    rollups = session.query(StatsRollup.start, StatsRollup.event, StatsRollup.count) \
+                     .filter(StatsRollup.tid == tid,
+                             StatsRollup.period == period,
+                             StatsRollup.start >= start,
+                             StatsRollup.start <= end) \
+                     .order_by(StatsRollup.start)
+
+    entries = []
+    total = {}
+    for rollup_start, event, count in rollups:
+        if not entries or entries[-1]['start'] != rollup_start:
+            entries.append({'start': rollup_start, 'summary': {}})
+
+        entries[-1]['summary'][event] = count
+        total[event] = total.get(event, 0) + count
+
+    for entry in entries:
+        entry['start'] = datetime_to_ISO8601(entry['start'])
+
+    return {
+        'tid': tid,
+        'period': period,
+        'start': datetime_to_ISO8601(start),
+        'end': datetime_to_ISO8601(end),
+        'entries': entries,
+        'total': total
+    }
+
+
+@transact
+def get_anomaly_history(session, tid, limit, since=None):
+    """
+    Returns the latest anomalies or, if since is specified, the anomalies
+    registered after the given date in chronological order
+    """
+    query = session.query(Anomalies).filter(Anomalies.tid == tid)
+
+    if since is None:
+        anomalies = query.order_by(Anomalies.date.desc())[:limit]
+    else:
+        anomalies = query.filter(Anomalies.date > since).order_by(Anomalies.date)[:limit]
 
     anomaly_history = []
     for _, anomaly in enumerate(anomalies):
@@ -133,7 +212,11 @@ class AnomalyCollection(BaseHandler):
     check_roles = 'admin'
 
     def get(self):
-        return get_anomaly_history(self.request.tid, limit=20)
+        since, limit = parse_cursor(self.request)
+        if isinstance(since, int):
+            raise errors.InputValidationError('Invalid cursor')
+
+        return get_anomaly_history(self.request.tid, limit=limit or 20, since=since)
 
 
 class StatsCollection(BaseHandler):
@@ -146,6 +229,39 @@ class StatsCollection(BaseHandler):
         return get_stats(self.request.tid, week_delta)
 
 
+class StatsRangeCollection(BaseHandler):
+    """
+    This Handler returns the stats aggregated by day or by week for
+    arbitrary ranges; the root tenant could access the stats of any tenant.
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        args = self.request.args
+
+        try:
+            period = args.get(b'period', [b'day'])[0].decode('utf-8')
+            if period not in ROLLUP_PERIODS:
+                raise ValueError
+
+            end = datetime_now()
+            if b'end' in args:
+                end = ISO8601_to_datetime(args[b'end'][0].decode('utf-8'))
+
+            start = end - timedelta(days=30)
+            if b'start' in args:
+                start = ISO8601_to_datetime(args[b'start'][0].decode('utf-8'))
+
+            tid = int(args.get(b'tid', [self.request.tid])[0])
+        except ValueError:
+            raise errors.InputValidationError('Invalid range')
+
+        if tid != self.request.tid and self.request.tid != 1:
+            raise errors.ForbiddenOperation
+
+        return get_stats_range(tid, period, start, end)
+
+
 class RecentEventsCollection(BaseHandler):
     """
     This handler is refreshed constantly by an admin page
@@ -153,25 +269,39 @@ class RecentEventsCollection(BaseHandler):
     """
     check_roles = 'admin'
 
-    def get_summary(self, templist):
+    def get_summary(self):
         eventmap = dict()
         for event in events_monitored:
             eventmap.setdefault(event['name'], 0)
 
-        for e in templist:
-            eventmap[e['event']] += 1
+        eventmap.update(State.tenant_state[self.request.tid].EventCounter.get_totals())
 
         return eventmap
 
-    def get(self, kind):
-        templist = [e.serialize() for e in State.tenant_state[self.request.tid].EventQ]
+    def get_details(self):
+        """
+        Returns the events registered after the cursor; being the queue
+        ordered by id only the new entries are visited.
+        """
+        since, limit = parse_cursor(self.request)
+
+        templist = []
+        for e in reversed(State.tenant_state[self.request.tid].EventQ):
+            if (isinstance(since, int) and e.id <= since) or \
+               (isinstance(since, datetime) and e.creation_date <= since):
+                break
+
+            templist.append(e)
 
-        templist.sort(key=operator.itemgetter('creation_date'))
+        templist.reverse()
 
+        return [e.serialize() for e in templist[:limit]]
+
+    def get(self, kind):
         if kind == 'details':
-            return templist
+            return self.get_details()
 
-        return self.get_summary(templist)
+        return self.get_summary()
 
 
 class JobsTiming(BaseHandler):
@@ -14,6 +14,7 @@ from globaleaks.handlers.admin import file
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import requests
+from globaleaks.sessions import Sessions
 from globaleaks.utils.log import log
 from globaleaks.settings import Settings
 from globaleaks.state import State
@@ -191,4 +192,6 @@ class TenantInstance(BaseHandler):
 
         log.info('Removing tenant with id: %d', tenant_id, tid=self.request.tid)
 
+        Sessions.revoke_tenant(tenant_id)
+
         return delete(tenant_id)
@@ -199,6 +199,9 @@ class TokenAuthHandler(BaseHandler):
             raise errors.InvalidAuthentication
 
         session = Sessions.regenerate(session.id)
+        if session is None:
+            Settings.failed_login_attempts += 1
+            raise errors.InvalidAuthentication
 
         log.debug("Login: Success (%s)" % session.user_role)
 
@@ -250,7 +253,7 @@ class SessionHandler(BaseHandler):
         """
         Logout
         """
-        del Sessions[self.current_user.id]
+        Sessions.delete(self.current_user.id)
 
 
 class TenantAuthSwitchHandler(BaseHandler):
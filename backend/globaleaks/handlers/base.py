@@ -85,6 +85,7 @@ class BaseHandler(object):
     upload_handler = False
     uploaded_file = None
     require_multisite = False
+    monitored_events = {}
 
     def __init__(self, state, request):
         self.name = type(self).__name__
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 #
 # API handling export of submissions
-import os
 
+from collections import deque
 from io import BytesIO
 from six import binary_type, text_type
+from twisted.internet import threads
 from twisted.internet.defer import Deferred, inlineCallbacks
 
 from globaleaks import models
@@ -16,12 +17,13 @@ from globaleaks.handlers.rtip import db_access_rtip, serialize_rtip
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.orm import transact
 from globaleaks.settings import Settings
+from globaleaks.utils.attachments import get_attachment_path, open_attachment
+from globaleaks.utils.log import log
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import msdos_encode, datetime_now
 from globaleaks.utils.zipstream import ZipStream
 
-@transact
-def get_tip_export(session, tid, user_id, rtip_id, language):
+def db_get_tip_export(session, tid, user_id, rtip_id, language):
     rtip, itip = db_access_rtip(session, tid, user_id, rtip_id)
 
     user, context = session.query(models.User, models.Context) \
@@ -56,7 +58,7 @@ def get_tip_export(session, tid, user_id, rtip_id, language):
         rfile.downloads += 1
         file_dict = models.serializers.serialize_rfile(session, tid, rfile)
         file_dict['name'] = 'files/' + file_dict['name']
-        file_dict['path'] = os.path.join(Settings.attachments_path, file_dict['filename'])
+        file_dict['path'] = get_attachment_path(file_dict['filename'])
         export_dict['files'].append(file_dict)
 
     for wf in session.query(models.WhistleblowerFile).filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
@@ -64,40 +66,104 @@ def get_tip_export(session, tid, user_id, rtip_id, language):
                                                              models.InternalTip.id == rtip.internaltip_id):
         file_dict = models.serializers.serialize_wbfile(session, tid, wf)
         file_dict['name'] = 'files_from_recipients/' + file_dict['name']
-        file_dict['path'] = os.path.join(Settings.attachments_path, file_dict['filename'])
+        file_dict['path'] = get_attachment_path(file_dict['filename'])
         export_dict['files'].append(file_dict)
 
     return export_dict
 
 
+@transact
+def get_tip_export(session, tid, user_id, rtip_id, language):
+    return db_get_tip_export(session, tid, user_id, rtip_id, language)
+
+
 class ZipStreamProducer(object):
-    """Streaming producter for ZipStream"""
+    """
+    Streaming producer for ZipStream
+
+    File reads and compression are performed in a worker thread so that
+    large exports do not stall the reactor; at most bufferChunks chunks are
+    kept ready in memory and production follows the consumer backpressure.
+    """
     bufferSize = Settings.file_chunk_size
+    bufferChunks = 4
 
     def __init__(self, handler, zipstreamObject):
         self.finish = Deferred()
         self.handler = handler
         self.zipstreamObject = zipstreamObject
+        self.buffer = deque()
+        self.paused = False
+        self.producing = False
+        self.eof = False
 
     def start(self):
-        self.handler.request.registerProducer(self, False)
+        self.handler.request.registerProducer(self, True)
+        self.produce()
         return self.finish
 
-    def resumeProducing(self):
-        try:
-            if not self.handler:
-                return
+    def produce(self):
+        if self.handler is None or self.producing or self.eof or \
+           len(self.buffer) >= self.bufferChunks:
+            return
 
-            data = self.zip_chunk()
-            if data:
-                self.handler.request.write(data)
-            else:
-                self.stopProducing()
-        except:
+        self.producing = True
+        d = threads.deferToThread(self.zip_chunk)
+        d.addCallbacks(self.chunkReady, self.chunkFailed)
+
+    def chunkReady(self, data):
+        self.producing = False
+
+        if self.handler is None:
+            return
+
+        if data:
+            self.buffer.append(data)
+        else:
+            self.eof = True
+
+        self.flush()
+        self.produce()
+
+    def chunkFailed(self, failure):
+        self.producing = False
+        log.err("Unable to complete the export: %s", failure.getErrorMessage())
+        self.abort()
+
+    def abort(self):
+        """
+        Drops the connection without completing the response so that the
+        truncated archive is not mistaken by the client for a complete one
+        """
+        if self.handler is None:
+            return
+
+        self.buffer.clear()
+        self.handler.request.unregisterProducer()
+        self.handler.request.transport.abortConnection()
+        self.handler = None
+        self.finish.callback(None)
+
+    def flush(self):
+        while self.buffer and not self.paused and self.handler is not None:
+            self.handler.request.write(self.buffer.popleft())
+
+        if self.eof and not self.buffer:
             self.stopProducing()
-            raise
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        self.flush()
+        self.produce()
 
     def stopProducing(self):
+        if self.handler is None:
+            return
+
+        self.buffer.clear()
         self.handler.request.unregisterProducer()
         self.handler.request.finish()
         self.handler = None
@@ -111,7 +177,7 @@ class ZipStreamProducer(object):
             if data:
                 chunk_size += len(data)
                 chunk.append(data)
-                if chunk_size >= Settings.file_chunk_size:
+                if chunk_size >= self.bufferSize:
                     return b''.join(chunk)
 
         return b''.join(chunk)
@@ -132,6 +198,6 @@ class ExportHandler(BaseHandler):
         self.request.setHeader(b'Content-Type', b'application/octet-stream')
         self.request.setHeader(b'Content-Disposition', b'attachment; filename="submission.zip"')
 
-        self.zip_stream = iter(ZipStream(tip_export['files']))
+        self.zip_stream = iter(ZipStream(tip_export['files'], open_attachment))
 
         yield ZipStreamProducer(self, self.zip_stream).start()
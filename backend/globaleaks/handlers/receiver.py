@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
 #
 # API handling recipient user functionalities
+from six import text_type
 from sqlalchemy.sql.expression import func, distinct
+from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
+from globaleaks.handlers.export import db_get_tip_export, ZipStreamProducer
 from globaleaks.handlers.rtip import db_postpone_expiration_date, db_delete_itip
 from globaleaks.handlers.submission import db_serialize_archived_preview_schema
 from globaleaks.handlers.user import db_user_update_user, user_serialize_user
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_sync
 from globaleaks.rest import requests, errors
 from globaleaks.state import State
+from globaleaks.utils.attachments import open_attachment
 from globaleaks.utils.structures import get_localized_values
 from globaleaks.utils.utility import datetime_to_ISO8601
+from globaleaks.utils.zipstream import ZipStream
 
 
 def receiver_serialize_receiver(session, tid, receiver, user, language):
@@ -154,6 +159,35 @@ def perform_tips_operation(session, tid, receiver_id, operation, rtips_ids):
             raise errors.ForbiddenOperation
 
 
+@transact
+def get_exportable_rtips_ids(session, tid, receiver_id, rtips_ids):
+    return [x[0] for x in session.query(models.ReceiverTip.id) \
+                                 .filter(models.ReceiverTip.receiver_id == receiver_id,
+                                         models.ReceiverTip.id.in_(rtips_ids),
+                                         models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                         models.InternalTip.tid == tid) \
+                                 .order_by(models.InternalTip.progressive)]
+
+
+@transact_sync
+def get_tips_export_batch(session, tid, receiver_id, rtips_ids, language):
+    return [db_get_tip_export(session, tid, receiver_id, rtip_id, language) for rtip_id in rtips_ids]
+
+
+def tips_export_files(tid, receiver_id, rtips_ids, language, batch_size):
+    """
+    Lazily yields the files of a bulk export; the tips are serialized
+    in batches while the archive is being produced so that only a batch
+    at a time is kept in memory.
+    """
+    for i in range(0, len(rtips_ids), batch_size):
+        for tip_export in get_tips_export_batch(tid, receiver_id, rtips_ids[i:i + batch_size], language):
+            prefix = text_type(tip_export['tip']['progressive']) + u'/'
+            for f in tip_export['files']:
+                f['name'] = prefix + f['name']
+                yield f
+
+
 class ReceiverInstance(BaseHandler):
     """
     This handler allow receivers to modify some of their fields:
@@ -208,3 +242,35 @@ class TipsOperations(BaseHandler):
                                       self.current_user.user_id,
                                       request['operation'],
                                       request['rtips'])
+
+
+class TipsExport(BaseHandler):
+    """
+    This interface receives a list of tips and streams a single archive
+    containing the export of all of them.
+    """
+    check_roles = 'receiver'
+    handler_exec_time_threshold = 3600
+    batch_size = 20
+
+    @inlineCallbacks
+    def post(self):
+        request = self.validate_message(self.request.content.read(), requests.ReceiverTipsExportDesc)
+
+        rtips_ids = yield get_exportable_rtips_ids(self.request.tid,
+                                                   self.current_user.user_id,
+                                                   request['rtips'])
+
+        self.request.setHeader(b'X-Download-Options', b'noopen')
+        self.request.setHeader(b'Content-Type', b'application/octet-stream')
+        self.request.setHeader(b'Content-Disposition', b'attachment; filename="submissions.zip"')
+
+        files = tips_export_files(self.request.tid,
+                                  self.current_user.user_id,
+                                  rtips_ids,
+                                  self.request.language,
+                                  self.batch_size)
+
+        self.zip_stream = iter(ZipStream(files, open_attachment))
+
+        yield ZipStreamProducer(self, self.zip_stream).start()
@@ -16,6 +16,7 @@ from globaleaks.models import serializers
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
+from globaleaks.utils.attachments import get_attachment_path, get_new_attachment_path, open_attachment
 from globaleaks.utils.security import directory_traversal_check
 from globaleaks.state import State
 from globaleaks.utils.utility import get_expiration, datetime_now, datetime_never, \
@@ -243,7 +244,7 @@ def db_get_rtip(session, tid, user_id, rtip_id, language):
 
 
 def db_mark_file_for_secure_deletion(session, relpath):
-    abspath = os.path.join(Settings.attachments_path, relpath)
+    abspath = get_attachment_path(relpath)
 
     if not os.path.isfile(abspath):
         log.err("Tried to permanently delete a non existent file: %s" % abspath)
@@ -523,7 +524,7 @@ class WhistleblowerFileHandler(BaseHandler):
         # First: dump the file in the filesystem
         filename = str.split(os.path.basename(self.uploaded_file['filename']), '.aes')[0] + '.plain'
 
-        dst = os.path.join(Settings.attachments_path, filename)
+        dst = get_new_attachment_path(filename)
 
         directory_traversal_check(Settings.attachments_path, dst)
 
@@ -566,11 +567,18 @@ class WBFileHandler(BaseHandler):
     def get(self, wbfile_id):
         wbfile = yield self.download_wbfile(self.request.tid, wbfile_id)
 
-        filelocation = os.path.join(Settings.attachments_path, wbfile['filename'])
+        filelocation = get_attachment_path(wbfile['filename'])
 
         directory_traversal_check(Settings.attachments_path, filelocation)
 
-        yield self.write_file_as_download(wbfile['name'], filelocation)
+        # the file could be moved by the migration to the sharded layout
+        # after the resolution of its path
+        try:
+            fo = open_attachment(filelocation)
+        except IOError:
+            raise errors.ResourceNotFound()
+
+        yield self.write_file_as_download_fo(wbfile['name'], fo)
 
 
 class RTipWBFileHandler(WBFileHandler):
@@ -630,11 +638,18 @@ class ReceiverFileDownload(BaseHandler):
     def get(self, rfile_id):
         rfile = yield self.download_rfile(self.request.tid, self.current_user.user_id, rfile_id)
 
-        filelocation = os.path.join(Settings.attachments_path, rfile['filename'])
+        filelocation = get_attachment_path(rfile['filename'])
 
         directory_traversal_check(Settings.attachments_path, filelocation)
 
-        yield self.write_file_as_download(rfile['name'], filelocation)
+        # the file could be moved by the migration to the sharded layout
+        # after the resolution of its path
+        try:
+            fo = open_attachment(filelocation)
+        except IOError:
+            raise errors.ResourceNotFound()
+
+        yield self.write_file_as_download_fo(rfile['name'], fo)
 
 
 class IdentityAccessRequestsCollection(BaseHandler):
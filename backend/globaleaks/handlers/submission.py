@@ -380,16 +380,24 @@ class SubmissionInstance(BaseHandler):
         """
         request = self.validate_message(self.request.content.read(), requests.SubmissionDesc)
 
-        # The get and use method will raise if the token is invalid
+        # The get, use and claim methods will raise if the token is invalid;
+        # the token is claimed before storing the submission so that it
+        # could not be used concurrently by another request
         token = TokenList.get(token_id)
         token.use()
-
-        submission = create_submission(self.request.tid,
-                                       request,
-                                       token.uploaded_files,
-                                       self.request.client_using_tor)
-
-        # Delete the token only when a valid submission has been stored in the DB
-        TokenList.delete(token_id)
-
-        return submission
+        TokenList.claim(token)
+
+        def success(submission):
+            # Delete the token only when a valid submission has been stored in the DB
+            TokenList.delete(token_id)
+            return submission
+
+        def failure(f):
+            # The token is released so that the submission could be retried
+            TokenList.release(token)
+            return f
+
+        return create_submission(self.request.tid,
+                                 request,
+                                 token.uploaded_files,
+                                 self.request.client_using_tor).addCallbacks(success, failure)
@@ -1,10 +1,12 @@
 from globaleaks.jobs import anomalies, \
+                            attachments_migration, \
                             daily, \
                             delivery, \
                             exit_nodes_refresh, \
                             notification, \
                             onion_service, \
                             pgp_check, \
+                            secure_file_deletion, \
                             session_management, \
                             statistics, \
                             update_check, \
@@ -12,11 +14,13 @@ from globaleaks.jobs import anomalies, \
 
 jobs_list = [
     anomalies.Anomalies,
+    attachments_migration.AttachmentsMigration,
     daily.Daily,
     delivery.Delivery,
     exit_nodes_refresh.ExitNodesRefresh,
     notification.Notification,
     pgp_check.PGPCheck,
+    secure_file_deletion.SecureFileDeletion,
     session_management.SessionManagement,
     statistics.Statistics,
     update_check.UpdateCheck,
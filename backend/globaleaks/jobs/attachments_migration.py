@@ -0,0 +1,70 @@
+# -*- coding: utf-8
+# Implements the background migration of the attachments stored in the flat
+# layout used by previous releases to the sharded layout
+from twisted.internet import threads
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.jobs.base import LoopingJob
+from globaleaks.utils import attachments
+from globaleaks.utils.log import log
+
+__all__ = ['AttachmentsMigration']
+
+
+class AttachmentsMigration(LoopingJob):
+    interval = 10
+    monitor_interval = 5 * 60
+
+    # Number of files moved on each run
+    batch_size = 1000
+
+    def __init__(self):
+        LoopingJob.__init__(self)
+        self.pending = []
+        self.completed = False
+
+        # Names of the flat files conflicting with a different file in
+        # the sharded layout; they are left in place and not retried
+        self.conflicts = set()
+
+    def migrate_batch(self):
+        """
+        Moves a batch of files to the sharded layout.
+
+        The flat directory is listed only when the names collected by the
+        previous listing have all been processed; being the state derived
+        only from the filesystem the migration resumes by itself on restart.
+        """
+        if not self.pending:
+            self.pending = [f for f in attachments.list_flat_attachments() if f not in self.conflicts]
+            if not self.pending:
+                return False
+
+        batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+
+        migrated = 0
+        for filename in batch:
+            try:
+                if attachments.migrate_attachment(filename):
+                    migrated += 1
+                else:
+                    log.err("Unable to migrate attachment %s: a different file is stored in the sharded layout", filename)
+                    self.conflicts.add(filename)
+            except OSError as excep:
+                log.err("Unable to migrate attachment %s: %s", filename, excep)
+
+        log.debug("Migrated %d attachments to the sharded layout (%d pending)", migrated, len(self.pending))
+
+        return True
+
+    @inlineCallbacks
+    def operation(self):
+        if not self.completed:
+            work_done = yield threads.deferToThread(self.migrate_batch)
+            if not work_done:
+                log.info("Migration of the attachments to the sharded layout completed")
+                self.completed = True
+
+        if self.completed:
+            # New files are always written in the sharded layout
+            self.stop()
@@ -8,9 +8,11 @@ from datetime import timedelta
 from sqlalchemy import not_
 from sqlalchemy.sql.expression import func
 
+from twisted.internet import threads
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
+from globaleaks.anomaly import prune_anomalies
 from globaleaks.handlers.admin.node import db_admin_serialize_node
 from globaleaks.handlers.admin.notification import db_get_notification
 from globaleaks.handlers.rtip import db_delete_itips
@@ -18,7 +20,7 @@ from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact
 from globaleaks.state import State
-from globaleaks.utils.security import overwrite_and_remove
+from globaleaks.utils.attachments import iter_attachments, remove_empty_shard_dirs
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601, is_expired
 
@@ -121,40 +123,21 @@ class Daily(LoopingJob):
         # delete stats older than 1 year
         session.query(models.Stats).filter(models.Stats.start < datetime_now() - timedelta(90)).delete(synchronize_session='fetch')
 
-        # delete anomalies older than 1 year
-        session.query(models.Anomalies).filter(models.Anomalies.date < datetime_now() - timedelta(365)).delete(synchronize_session='fetch')
-
         # delete archived schemas not used by any existing submission
         hashes = [x[0] for x in session.query(models.InternalTip.questionnaire_hash)]
         if hashes:
             session.query(models.ArchivedSchema).filter(not_(models.ArchivedSchema.hash.in_(hashes))).delete(synchronize_session='fetch')
 
-    @transact
-    def get_files_to_secure_delete(self, session):
-        return [x[0] for x in session.query(models.SecureFileDelete.filepath)]
-
-    @transact
-    def commit_files_deletion(self, session, filepaths):
-        session.query(models.SecureFileDelete).filter(models.SecureFileDelete.filepath.in_(filepaths)).delete(synchronize_session='fetch')
-
-    @inlineCallbacks
-    def perform_secure_deletion_of_files(self):
-        # Delete files that are marked for secure deletion
-        files_to_delete = yield self.get_files_to_secure_delete()
-        for file_to_delete in files_to_delete:
-            overwrite_and_remove(file_to_delete)
-
-        if files_to_delete:
-            yield self.commit_files_deletion(files_to_delete)
-
+    def perform_cleaning_of_files(self):
         # Delete the outdated AES files older than 1 day
-        files_to_remove = [f for f in os.listdir(self.state.settings.attachments_path) if fnmatch.fnmatch(f, '*.aes')]
-        for f in files_to_remove:
-            path = os.path.join(self.state.settings.attachments_path, f)
+        files_to_remove = [path for f, path in iter_attachments() if fnmatch.fnmatch(f, '*.aes')]
+        for path in files_to_remove:
             timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(path))
             if is_expired(timestamp, days=1):
                 os.remove(path)
 
+        remove_empty_shard_dirs()
+
         # Delete the backups older than 15 days
         for f in os.listdir(self.state.settings.backups_path):
             path = os.path.join(self.state.settings.backups_path, f)
@@ -178,5 +161,7 @@ class Daily(LoopingJob):
     def operation(self):
         yield self.daily_clean()
 
-        yield self.perform_secure_deletion_of_files()
+        yield prune_anomalies(datetime_now() - timedelta(self.state.settings.anomalies_retention_days))
+
+        yield threads.deferToThread(self.perform_cleaning_of_files)
 
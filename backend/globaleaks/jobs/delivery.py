@@ -12,9 +12,9 @@ from twisted.internet.defer import inlineCallbacks
 from globaleaks import models
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact
+from globaleaks.utils.attachments import get_new_attachment_path
 from globaleaks.utils.pgp import PGPContext
 from globaleaks.utils.security import generateRandomKey
-from globaleaks.settings import Settings
 from globaleaks.utils.log import log
 
 __all__ = ['Delivery']
@@ -107,7 +107,7 @@ def fsops_pgp_encrypt(state, sf, key, fingerprint):
     pgpctx.load_key(key)
 
     with sf.open('rb') as f:
-        encrypted_file_path = os.path.abspath(os.path.join(state.settings.attachments_path, "pgp_encrypted-%s" % generateRandomKey(16)))
+        encrypted_file_path = get_new_attachment_path("pgp_encrypted-%s" % generateRandomKey(16))
         _, encrypted_file_size = pgpctx.encrypt_file(fingerprint, f, encrypted_file_path)
 
     return os.path.basename(encrypted_file_path), encrypted_file_size
@@ -121,7 +121,7 @@ def process_files(state, receiverfiles_maps):
     for ifile_id, receiverfiles_map in receiverfiles_maps.items():
         ifile_name = receiverfiles_map['ifile_name']
         plain_name = "%s.plain" % ifile_name.split('.')[0]
-        plain_path = os.path.abspath(os.path.join(Settings.attachments_path, plain_name))
+        plain_path = get_new_attachment_path(plain_name)
 
         sf = state.get_tmp_file_by_name(ifile_name)
 
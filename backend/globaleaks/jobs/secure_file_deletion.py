@@ -0,0 +1,131 @@
+# -*- coding: utf-8
+# Implements the secure deletion of the files marked for deletion
+import os
+import time
+from datetime import timedelta
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, DeferredList
+from twisted.internet.threads import deferToThread, deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from globaleaks import models
+from globaleaks.jobs.base import LoopingJob
+from globaleaks.orm import transact
+from globaleaks.utils.attachments import resolve_attachment_path
+from globaleaks.utils.log import log
+from globaleaks.utils.security import overwrite
+from globaleaks.utils.utility import datetime_now
+
+__all__ = ['SecureFileDeletion']
+
+
+def secure_delete_file(filepath, rate_limit):
+    """
+    Overwrites and removes a file; unlike overwrite_and_remove the errors
+    are raised so that the file is not removed without being overwritten
+    and its deletion is retried.
+    """
+    if not os.path.exists(filepath):
+        # the file has been removed by a previous attempt
+        return 0, 0
+
+    start = time.time()
+
+    size = os.path.getsize(filepath)
+
+    overwrite(filepath, rate_limit=rate_limit)
+
+    os.remove(filepath)
+
+    return size, time.time() - start
+
+
+class SecureFileDeletion(LoopingJob):
+    """
+    This job serves the queue of the files marked for secure deletion
+    with a dedicated pool of threads.
+
+    A SecureFileDelete entry is removed only after the deletion of its
+    file has completed so that pending work is resumed after a restart.
+    Failed deletions are retried with an exponential backoff up to
+    secure_file_delete_max_attempts times; the entries that reached
+    the limit are kept in the database but not served anymore.
+    """
+    interval = 60
+    monitor_interval = 3600
+
+    def __init__(self):
+        LoopingJob.__init__(self)
+        self.threadpool = ThreadPool(0, self.state.settings.secure_file_delete_threads, self.name)
+        self.threadpool.start()
+
+    def stop(self):
+        d = LoopingJob.stop(self)
+
+        # the threads are joined outside of the reactor thread once the
+        # running operation has completed
+        return d.addCallback(lambda _: deferToThread(self.threadpool.stop))
+
+    @transact
+    def get_files_to_secure_delete(self, session, limit):
+        query = session.query(models.SecureFileDelete) \
+                       .filter(models.SecureFileDelete.attempts < self.state.settings.secure_file_delete_max_attempts,
+                               models.SecureFileDelete.next_try <= datetime_now()) \
+                       .order_by(models.SecureFileDelete.next_try) \
+                       .limit(limit)
+
+        return [(x.id, x.filepath) for x in query]
+
+    @transact
+    def register_failed_attempt(self, session, secure_file_delete_id):
+        """
+        Increments the failed attempts of a deletion and postpones the next
+        attempt doubling the delay; returns the number of failed attempts
+        """
+        secure_file_delete = session.query(models.SecureFileDelete).filter(models.SecureFileDelete.id == secure_file_delete_id).one()
+        secure_file_delete.attempts += 1
+        secure_file_delete.next_try = datetime_now() + \
+            timedelta(seconds=self.state.settings.secure_file_delete_retry_delay * 2 ** (secure_file_delete.attempts - 1))
+
+        return secure_file_delete.attempts
+
+    @transact
+    def commit_file_deletion(self, session, secure_file_delete_id):
+        session.query(models.SecureFileDelete).filter(models.SecureFileDelete.id == secure_file_delete_id).delete(synchronize_session=False)
+
+    @inlineCallbacks
+    def delete_file(self, secure_file_delete_id, filepath):
+        filepath = resolve_attachment_path(filepath)
+
+        try:
+            size, elapsed = yield deferToThreadPool(reactor,
+                                                    self.threadpool,
+                                                    secure_delete_file,
+                                                    filepath,
+                                                    self.state.settings.secure_file_delete_rate_limit)
+        except Exception as excep:
+            attempts = yield self.register_failed_attempt(secure_file_delete_id)
+            max_attempts = self.state.settings.secure_file_delete_max_attempts
+
+            log.err("Unable to complete the secure deletion of %s (attempt %d of %d): %s",
+                    filepath, attempts, max_attempts, excep)
+
+            if attempts >= max_attempts:
+                log.err("Giving up the secure deletion of %s", filepath)
+
+            return
+
+        log.info("Secure deletion of %s (%d bytes) completed in %.3f seconds", filepath, size, elapsed)
+
+        yield self.commit_file_deletion(secure_file_delete_id)
+
+    @inlineCallbacks
+    def operation(self):
+        files_to_delete = yield self.get_files_to_secure_delete(self.state.settings.secure_file_delete_batch_size)
+
+        results = yield DeferredList([self.delete_file(*x) for x in files_to_delete], consumeErrors=True)
+
+        for success, result in results:
+            if not success:
+                log.err("Unable to complete the secure deletion of a file: %s", result.getErrorMessage())
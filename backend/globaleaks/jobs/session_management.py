@@ -1,6 +1,7 @@
 # -*- coding: utf-8
 # Implement reset of variables related to sessions
 from globaleaks.jobs.base import LoopingJob
+from globaleaks.sessions import Sessions
 
 __all__ = ['SessionManagement']
 
@@ -14,6 +15,10 @@ class SessionManagement(LoopingJob):
         This scheduler is responsible for:
             - Reset of failed login attempts counters
             - Refresh of the api_token's suspension
+            - Purge of the expired entries of the shared store
         """
         self.state.settings.failed_login_attempts = 0
         self.state.api_token_session_suspended = False
+
+        if Sessions.store is not None:
+            Sessions.store.purge()
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 # Implement collection of statistics
+from datetime import timedelta
+
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks.jobs.base import LoopingJob
-from globaleaks.models import Stats
+from globaleaks.models import Stats, StatsRollup
 from globaleaks.orm import transact
 from globaleaks.utils.utility import datetime_now
 from globaleaks.utils.log import log
@@ -13,14 +15,53 @@ def get_statistics(state):
     stats = {}
 
     for tid in state.tenant_state:
-        stats[tid] = {}
-        for e in state.tenant_state[tid].EventQ:
-            stats[tid].setdefault(e.event_type, 0)
-            stats[tid][e.event_type] += 1
+        stats[tid] = state.tenant_state[tid].EventCounter.get_totals()
 
     return stats
 
 
+ROLLUP_PERIODS = (u'day', u'week')
+
+
+def get_rollup_start(period, date):
+    """
+    Returns the start of the day or of the week (monday) including the date
+    """
+    date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == u'week':
+        date -= timedelta(days=date.weekday())
+
+    return date
+
+
+def get_rollup_keys(tid, start, summary):
+    """
+    Yields the keys of the rollups to be incremented with the counters
+    of the hourly summary and the corresponding increments
+    """
+    for period in ROLLUP_PERIODS:
+        period_start = get_rollup_start(period, start)
+        for event, count in summary.items():
+            yield (tid, period, period_start, event), count
+
+
+def db_update_rollups(session, tid, start, summary):
+    for key, count in get_rollup_keys(tid, start, summary):
+        rollup = session.query(StatsRollup).get(key)
+        if rollup is None:
+            rollup = StatsRollup({
+                'tid': key[0],
+                'period': key[1],
+                'start': key[2],
+                'event': key[3],
+                'count': 0
+            })
+            session.add(rollup)
+
+        rollup.count += count
+
+
 @transact
 def save_statistics(session, start, end, stats):
     for tid in stats:
@@ -34,6 +75,8 @@ def save_statistics(session, start, end, stats):
         newstat.summary = stats[tid]
         session.add(newstat)
 
+        db_update_rollups(session, tid, start, stats[tid])
+
 
 class Statistics(LoopingJob):
     """
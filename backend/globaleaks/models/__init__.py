@@ -860,6 +860,10 @@ class _SecureFileDelete(Model):
 
     filepath = Column(UnicodeText, nullable=False)
 
+    # failed attempts of secure deletion and time of the next one
+    attempts = Column(Integer, default=0, nullable=False)
+    next_try = Column(DateTime, default=datetime_null, nullable=False)
+
 
 class _Signup(Model):
     __tablename__ = 'signup'
@@ -963,6 +967,28 @@ class _Stats(Model):
         return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
 
 
+class _StatsRollup(Model):
+    """
+    Class used to keep the counters of the events aggregated by day and by week
+    """
+    __tablename__ = 'stats_rollup'
+
+    tid = Column(Integer, primary_key=True, default=1, nullable=False)
+    period = Column(Unicode(8), primary_key=True, nullable=False)
+    start = Column(DateTime, primary_key=True, nullable=False)
+    event = Column(Unicode(64), primary_key=True, nullable=False)
+
+    count = Column(Integer, default=0, nullable=False)
+
+    unicode_keys = ['period', 'event']
+    int_keys = ['count']
+    datetime_keys = ['start']
+
+    @declared_attr
+    def __table_args__(cls): # pylint: disable=no-self-argument
+        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+
+
 class _SubmissionStatus(Model):
     """
     Contains the statuses a submission may be in
@@ -1214,6 +1240,7 @@ class SubmissionStatus(_SubmissionStatus, Base): pass
 class SubmissionSubStatus(_SubmissionSubStatus, Base): pass
 class SubmissionStatusChange(_SubmissionStatusChange, Base): pass
 class Stats(_Stats, Base): pass
+class StatsRollup(_StatsRollup, Base): pass
 class Step(_Step, Base): pass
 class Tenant(_Tenant, Base): pass
 class User(_User, Base): pass
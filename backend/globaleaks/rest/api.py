@@ -17,6 +17,7 @@ from twisted.web.resource import Resource
 from twisted.web.server import NOT_DONE_YET
 
 from globaleaks import LANGUAGES_SUPPORTED_CODES
+from globaleaks.event import get_monitored_events
 from globaleaks.handlers import custodian, \
                                 email_validation, \
                                 exception, \
@@ -109,6 +110,7 @@ api_spec = [
     (r'/receiver/preferences', receiver.ReceiverInstance),
     (r'/receiver/tips', receiver.TipsCollection),
     (r'/rtip/operations', receiver.TipsOperations),
+    (r'/rtip/export', receiver.TipsExport),
 
     (r'/custodian/identityaccessrequests', custodian.IdentityAccessRequestsCollection),
     (r'/custodian/identityaccessrequest/' + uuid_regexp, custodian.IdentityAccessRequestInstance),
@@ -146,6 +148,7 @@ api_spec = [
     (r'/admin/shorturls', admin_shorturl.ShortURLCollection),
     (r'/admin/shorturls/' + uuid_regexp, admin_shorturl.ShortURLInstance),
     (r'/admin/stats/(\d+)', admin_statistics.StatsCollection),
+    (r'/admin/stats/range', admin_statistics.StatsRangeCollection),
     (r'/admin/activities/(summary|details)', admin_statistics.RecentEventsCollection),
     (r'/admin/anomalies', admin_statistics.AnomalyCollection),
     (r'/admin/jobs', admin_statistics.JobsTiming),
@@ -241,6 +244,10 @@ class APIResourceWrapper(Resource):
                     if hasattr(handler, m):
                         decorate_method(handler, m)
 
+            # the map is set on each handler class as the subclasses of a
+            # decorated handler would otherwise inherit the map of their parent
+            handler.monitored_events = get_monitored_events(handler)
+
             self._registry.append((re.compile(pattern), handler, args))
 
     def should_redirect_https(self, request):
@@ -333,7 +340,8 @@ class APIResourceWrapper(Resource):
             request.hostname = request.getRequestHostname()
 
         request.hostname = request.hostname.split(b':')[0]
-        request.port = request.getHost().port
+        # the requests received on the UNIX socket have no port
+        request.port = getattr(request.getHost(), 'port', None)
 
         if (request.hostname == b'localhost' or
             isIPAddress(request.hostname) or
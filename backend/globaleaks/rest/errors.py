@@ -189,3 +189,9 @@ class AccessLocationInvalid(GLException):
     reason = "IP Address not allows to login from this location"
     error_code = 17
     status_code = 401
+
+
+class StoreBusy(GLException):
+    reason = "The store of the sessions is busy"
+    error_code = 18
+    status_code = 503 # Service not available
@@ -5,6 +5,9 @@ from globaleaks.utils.security import generateRandomKey
 from globaleaks.utils.tempdict import TempDict
 
 class Session(object):
+    # attributes of the session shared with the other processes through the store
+    shared_attributes = ('id', 'tid', 'user_id', 'user_role', 'pcn')
+
     def __init__(self, tid, user_id, user_role, pcn):
         self.id = generateRandomKey(42)
         self.tid = tid
@@ -13,6 +16,19 @@ class Session(object):
         self.pcn = pcn
         self.expireCall = None
 
+    @classmethod
+    def from_shared_state(cls, state):
+        session = cls.__new__(cls)
+        session.expireCall = None
+
+        for k in cls.shared_attributes:
+            setattr(session, k, state[k])
+
+        return session
+
+    def get_shared_state(self):
+        return {k: getattr(self, k) for k in self.shared_attributes}
+
     def getTime(self):
         return self.expireCall.getTime() if self.expireCall else 0
 
@@ -28,10 +44,55 @@ class Session(object):
 
 class SessionsFactory(TempDict):
     """Extends TempDict to provide session management functions ontop of temp session keys"""
+    indexes = {
+        'user_id': lambda session: session.user_id,
+        'tid': lambda session: session.tid
+    }
+
+    # Store used to share the sessions with the other backend processes;
+    # when it is set it is authoritative and this dictionary acts as a cache
+    store = None
+
+    def set(self, key, item):
+        TempDict.set(self, key, item)
+
+        if self.store is not None:
+            self.store.set(u'session', key, item.get_shared_state(), self.get_timeout(), item.tid, item.user_id)
+
+    def get(self, key):
+        if self.store is not None:
+            state = self.store.get(u'session', key, self.get_timeout())
+            if state is None:
+                # the session has been revoked or expired by another process
+                if key in self:
+                    del self[key]
+
+                return None
+
+            if key not in self:
+                TempDict.set(self, key, Session.from_shared_state(state))
+
+        return TempDict.get(self, key)
+
+    def delete(self, key):
+        TempDict.delete(self, key)
+
+        if self.store is not None:
+            self.store.delete(u'session', key)
+
     def revoke(self, user_id):
-        for k, v in list(self.items()):
-            if v.user_id == user_id:
-                del self[k]
+        for session_id in self.lookup('user_id', user_id):
+            del self[session_id]
+
+        if self.store is not None:
+            self.store.delete_by(u'session', owner=user_id)
+
+    def revoke_tenant(self, tid):
+        for session_id in self.lookup('tid', tid):
+            del self[session_id]
+
+        if self.store is not None:
+            self.store.delete_by(u'session', tid=tid)
 
     def new(self, tid, user_id, user_role, pcn):
         session = Session(tid, user_id, user_role, pcn)
@@ -41,6 +102,12 @@ class SessionsFactory(TempDict):
 
     def regenerate(self, session_id):
         session = self.pop(session_id)
+
+        # the consumption of the old session is atomic so that a session
+        # token could be exchanged only once also across processes
+        if self.store is not None and self.store.consume(u'session', session_id) is None:
+            return None
+
         session.id = generateRandomKey(42)
         self.set(session.id, session)
         return session
@@ -133,6 +133,46 @@ class SettingsClass(object):
         self.devel_mode = False
         self.disable_swap = False
 
+        # Backend of the store used to share sessions and tokens among
+        # multiple backend processes; None keeps them inside the process
+        self.store = None
+
+        # Connections kept alive by each HTTPS worker toward the backend
+        self.proxy_pool_max_connections = 16
+        self.proxy_pool_idle_timeout = 60
+
+        # Interval of the statistics reported by the HTTPS workers and of the
+        # evaluation of their load done to adapt the number of workers
+        self.proxy_pool_stats_interval = 10
+
+        # Number of HTTPS workers; 0 as minimum launches one worker per CPU
+        # and 0 as maximum limits them to one per CPU
+        self.https_workers_min = 0
+        self.https_workers_max = 0
+
+        # Number of HTTPS workers replaced at a time during a reload and
+        # seconds waited for the new workers to be ready
+        self.https_reload_batch_size = 1
+        self.https_reload_ready_timeout = 30
+
+        # Number of TLS contexts of the tenant sites kept by each HTTPS worker
+        self.sni_cache_size = 256
+
+        # Seconds for which the TLS sessions can be resumed on the HTTPS worker that created them
+        self.tls_session_timeout = 300
+
+        # Bytes of the files of the client cached and served by each HTTPS
+        # worker without forwarding the requests to the backend; 0 disables the cache
+        self.static_cache_size = 32 * 1024 * 1024
+
+        # Offer HTTP/2 through ALPN on the connections to the HTTPS workers;
+        # it is disabled by default as the h2 library is an optional dependency
+        self.http2 = False
+
+        # Let the HTTPS workers reach the backend through a UNIX socket
+        # in the working directory instead of the local TCP port
+        self.unix_socket = False
+
         # Number of failed login enough to generate an alarm
         self.failed_login_alarm = 5
 
@@ -148,6 +188,13 @@ class SettingsClass(object):
         # size used while streaming files
         self.file_chunk_size = 65535 # 64kb
 
+        # secure deletion of files
+        self.secure_file_delete_threads = 2
+        self.secure_file_delete_batch_size = 100
+        self.secure_file_delete_rate_limit = 0 # bytes/s per thread, 0 means unlimited
+        self.secure_file_delete_max_attempts = 10
+        self.secure_file_delete_retry_delay = 60 # seconds, doubled after each failed attempt
+
         self.AES_key_id_regexp = u'[A-Za-z0-9]{16}'
         self.AES_file_regexp = r'(.*)\.aes'
         self.AES_file_regexp_comp = re.compile(self.AES_file_regexp)
@@ -155,6 +202,13 @@ class SettingsClass(object):
 
         self.exceptions_email_hourly_limit = 20
 
+        # maximum number of recent events kept in memory for each tenant
+        self.event_queue_size = 1000
+
+        # retention of the anomalies and number of rows deleted per transaction
+        self.anomalies_retention_days = 365
+        self.anomalies_prune_chunk_size = 1000
+
         self.enable_input_length_checks = True
 
         self.submission_minimum_delay = 3 # seconds
@@ -183,6 +237,12 @@ class SettingsClass(object):
 
         self.db_schema = os.path.join(self.static_db_source, 'sqlite.sql')
         self.db_file_path = os.path.abspath(os.path.join(self.working_path, 'globaleaks.db'))
+        self.store_file_path = os.path.abspath(os.path.join(self.working_path, 'store.db'))
+        self.unix_socket_path = os.path.abspath(os.path.join(self.working_path, 'backend.sock'))
+
+        # Marker written on clean shutdown; its presence at startup allows
+        # to skip the reconciliation of the attachments with the database
+        self.clean_shutdown_file_path = os.path.abspath(os.path.join(self.working_path, 'clean_shutdown'))
 
         self.logfile = os.path.abspath(os.path.join(self.log_path, 'globaleaks.log'))
         self.httplogfile = os.path.abspath(os.path.join(self.log_path, "http.log"))
@@ -251,6 +311,19 @@ class SettingsClass(object):
 
         self.orm_debug = self.cmdline_options.orm_debug
 
+        self.store = self.cmdline_options.store
+
+        self.unix_socket = self.cmdline_options.unix_socket
+
+        self.http2 = self.cmdline_options.enable_http2
+
+        self.https_workers_min = self.cmdline_options.https_workers_min
+        self.https_workers_max = self.cmdline_options.https_workers_max
+        if self.https_workers_min < 0 or self.https_workers_max < 0 or \
+           0 < self.https_workers_max < self.https_workers_min:
+            self.print_msg("Invalid number of HTTPS workers: %d-%d" % (self.https_workers_min, self.https_workers_max))
+            sys.exit(1)
+
         if self.cmdline_options.working_path:
             self.working_path = self.cmdline_options.working_path
 
@@ -4,6 +4,7 @@ import re
 import sys
 import traceback
 
+from collections import deque
 from six import text_type
 
 from twisted.internet import defer
@@ -14,6 +15,8 @@ from twisted.python.threadpool import ThreadPool
 from globaleaks import __version__, orm, models
 from globaleaks.transactions import schedule_email
 from globaleaks.utils.agent import get_tor_agent, get_web_agent
+from globaleaks.utils.attachments import iter_attachments
+from globaleaks.utils.eventcounter import EventCounter
 from globaleaks.utils.mail import sendmail
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.singleton import Singleton
@@ -30,11 +33,23 @@ def getAlarm(state):
     return Alarm(state)
 
 
+class TempUploadFilesDict(TempDict):
+    indexes = {
+        'filename': lambda f: os.path.basename(f.filepath)
+    }
+
+
 class TenantState(object):
     def __init__(self, state):
-        self.RecentEventQ = []
-        self.EventQ = []
+        # Counters of the events used by anomaly detection and statistics
+        self.EventCounter = EventCounter()
+
+        # Latest events kept for the real time monitoring
+        self.EventQ = deque(maxlen=state.settings.event_queue_size)
+
+        # Anomalies detected and the index of the first one not yet saved
         self.AnomaliesQ = []
+        self.anomalies_watermark = 0
 
         # An ACME challenge will have 5 minutes to resolve
         self.acme_tmp_chall_dict = TempDict(300)
@@ -55,6 +70,7 @@ class StateClass(ObjectDict):
 
         self.https_socks = []
         self.http_socks = []
+        self.unix_sock = None
 
         self.jobs = []
         self.jobs_monitor = None
@@ -75,7 +91,7 @@ class StateClass(ObjectDict):
         self.tenant_hostname_id_map = {}
 
         self.set_orm_tp(ThreadPool(4, 16))
-        self.TempUploadFiles = TempDict(timeout=3600)
+        self.TempUploadFiles = TempUploadFilesDict(timeout=3600)
 
         self.shutdown = False
 
@@ -151,8 +167,7 @@ class StateClass(ObjectDict):
         # will be automagically handled by delivery sched.
         keypath = os.path.join(self.settings.tmp_path, self.settings.AES_keyfile_prefix)
 
-        for f in os.listdir(self.settings.attachments_path):
-            path = os.path.join(self.settings.attachments_path, f)
+        for f, path in iter_attachments():
             try:
                 result = self.settings.AES_file_regexp_comp.match(f)
                 if result is not None:
@@ -254,9 +269,8 @@ class StateClass(ObjectDict):
 
             self.onion_service_job.remove_unwanted_hidden_services().addBoth(f) # pylint: disable=no-member
 
-        self.process_supervisor.shutdown()
-
-        self.process_supervisor.maybe_launch_https_workers()
+        # the sites of the running https workers are updated without restarting them
+        self.process_supervisor.update_https_workers()
 
     def format_and_send_mail(self, session, tid, user_desc, template_vars):
         subject, body = Templating().get_mail_subject_and_body(template_vars)
@@ -274,9 +288,8 @@ class StateClass(ObjectDict):
         }))
 
     def get_tmp_file_by_name(self, filename):
-        for k, v in self.TempUploadFiles.items():
-            if os.path.basename(v.filepath) == filename:
-                return self.TempUploadFiles.pop(k)
+        for k in self.TempUploadFiles.lookup('filename', filename):
+            return self.TempUploadFiles.pop(k)
 
 
 def mail_exception_handler(etype, value, tback):
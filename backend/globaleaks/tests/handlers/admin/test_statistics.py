@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+from datetime import timedelta
+
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks import anomaly
+from globaleaks import anomaly, event
 from globaleaks.handlers.admin import statistics
 from globaleaks.jobs.anomalies import Anomalies
 from globaleaks.jobs.statistics import Statistics
+from globaleaks.rest import errors
+from globaleaks.sessions import Sessions
+from globaleaks.state import State
 from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_now
 
 
 class TestStatsCollection(helpers.TestHandler):
@@ -31,6 +37,43 @@ class TestStatsCollection(helpers.TestHandler):
             self.assertEqual(len(response['heatmap']), 7 * 24)
 
 
+class TestStatsRangeCollection(helpers.TestHandlerWithPopulatedDB):
+    _handler = statistics.StatsRangeCollection
+
+    @inlineCallbacks
+    def test_get(self):
+        self.pollute_events(3)
+
+        yield Statistics().run()
+
+        for period in ['day', 'week']:
+            handler = self.request({}, role='admin')
+            handler.request.args = {b'period': [period.encode()]}
+            response = yield handler.get()
+
+            self.assertEqual(response['period'], period)
+            self.assertEqual(len(response['entries']), 1)
+            for e in event.events_monitored:
+                self.assertEqual(response['total'][e['name']], 6)
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'end': [b'2000-01-01T00:00:00Z']}
+        response = yield handler.get()
+        self.assertEqual(response['entries'], [])
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'period': [b'year']}
+        self.assertRaises(errors.InputValidationError, handler.get)
+
+    def test_get_other_tenant(self):
+        session = Sessions.new(2, self.dummyAdminUser['id'], 'admin', False)
+
+        handler = self.request({}, headers={'x-session': session.id.encode()})
+        handler.request.tid = 2
+        handler.request.args = {b'tid': [b'1']}
+        self.assertRaises(errors.ForbiddenOperation, handler.get)
+
+
 class TestAnomalyCollection(helpers.TestHandler):
     _handler = statistics.AnomalyCollection
 
@@ -48,6 +91,15 @@ class TestAnomalyCollection(helpers.TestHandler):
         self.assertTrue(isinstance(response, list))
         self.assertEqual(len(response), 1)
 
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'since': [response[0]['date'].encode()]}
+        response = yield handler.get()
+        self.assertEqual(response, [])
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'since': [b'1']}
+        self.assertRaises(errors.InputValidationError, handler.get)
+
 
 class TestRecentEventsCollection(helpers.TestHandler):
     _handler = statistics.RecentEventsCollection
@@ -73,6 +125,44 @@ class TestRecentEventsCollection(helpers.TestHandler):
         for k in anomaly.ANOMALY_MAP:
             self.assertTrue(k in response)
 
+    def test_get_details_since(self):
+        self.pollute_events(3)
+
+        handler = self.request({}, role='admin')
+        events = handler.get('details')
+        self.assertEqual(len(events), 3 * len(event.events_monitored) * 2)
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'since': [str(events[9]['id']).encode()], b'limit': [b'5']}
+        response = handler.get('details')
+        self.assertEqual(response, events[10:15])
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'since': [str(events[-1]['id']).encode()]}
+        self.assertEqual(handler.get('details'), [])
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'limit': [b'0']}
+        self.assertRaises(errors.InputValidationError, handler.get, 'details')
+
+    def test_get_details_since_restart(self):
+        now = datetime_now()
+        self.patch(event, 'datetime_now', lambda: now)
+        self.pollute_events(1)
+
+        handler = self.request({}, role='admin')
+        events = handler.get('details')
+
+        # the ids of the events registered after a restart follow the previous ones
+        State.tenant_state[1].EventQ.clear()
+        self.patch(event.Event, 'last_id', 0)
+        self.patch(event, 'datetime_now', lambda: now + timedelta(seconds=1))
+        self.pollute_events(1)
+
+        handler = self.request({}, role='admin')
+        handler.request.args = {b'since': [str(events[-1]['id']).encode()]}
+        self.assertEqual(len(handler.get('details')), len(events))
+
 
 class TestJobsTiming(helpers.TestHandler):
     _handler = statistics.JobsTiming
@@ -5,6 +5,7 @@ from globaleaks.handlers import attachment
 from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from globaleaks.utils import token
+from globaleaks.utils.attachments import get_attachment_path
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -37,7 +38,7 @@ class TestSubmissionAttachment(helpers.TestHandlerWithPopulatedDB):
         token.TokenList.reactor.advance(1)
 
         for f in self.dummyToken.uploaded_files:
-            path = os.path.abspath(os.path.join(self.state.settings.attachments_path, f['filename']))
+            path = get_attachment_path(f['filename'])
             yield self.assertFalse(os.path.exists(path))
 
     def test_post_file_on_unexistent_submission(self):
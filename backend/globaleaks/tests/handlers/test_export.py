@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
+from io import BytesIO
+from zipfile import ZipFile
 
 from globaleaks.handlers import export
 from globaleaks.jobs.delivery import Delivery
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
+from twisted.test.proto_helpers import StringTransport
 
 class TestExportHandler(helpers.TestHandlerWithPopulatedDB):
     complex_field_population = True
@@ -31,3 +34,25 @@ class TestExportHandler(helpers.TestHandlerWithPopulatedDB):
 
         yield handler.get(rtips_desc[0]['id'])
         self.assertNotEqual(handler.request.getResponseBody(), b'')
+
+        with ZipFile(BytesIO(handler.request.getResponseBody()), 'r') as f:
+            self.assertIsNone(f.testzip())
+            self.assertIn('data.txt', f.namelist())
+
+    @inlineCallbacks
+    def test_export_failure(self):
+        rtips_desc = yield self.get_rtips()
+
+        handler = self.request({}, role='receiver')
+        handler.current_user.user_id = rtips_desc[0]['receiver_id']
+        handler.request.transport = StringTransport()
+
+        def zip_chunk(self):
+            raise IOError("Input/output error")
+
+        self.patch(export.ZipStreamProducer, 'zip_chunk', zip_chunk)
+
+        # the connection is dropped instead of completing a truncated archive
+        yield handler.get(rtips_desc[0]['id'])
+        self.assertFalse(handler.request.finished)
+        self.assertTrue(handler.request.transport.disconnecting)
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+from io import BytesIO
+from zipfile import ZipFile
+
 from globaleaks import models
 from globaleaks.handlers.admin import receiver as admin_receiver
 from globaleaks.handlers import receiver
+from globaleaks.jobs.delivery import Delivery
 from globaleaks.orm import transact
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_never
@@ -105,3 +109,29 @@ class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
         rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
 
         self.assertEqual(len(rtips), 0)
+
+
+class TestTipsExport(helpers.TestHandlerWithPopulatedDB):
+    _handler = receiver.TipsExport
+
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestHandlerWithPopulatedDB.setUp(self)
+        for _ in range(3):
+            yield self.perform_full_submission_actions()
+
+        yield Delivery().run()
+
+    @inlineCallbacks
+    def test_post(self):
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        rtips_ids = [rtip['id'] for rtip in rtips]
+
+        handler = self.request({'rtips': rtips_ids}, user_id=self.dummyReceiver_1['id'], role='receiver')
+        handler.batch_size = 2
+        yield handler.post()
+
+        with ZipFile(BytesIO(handler.request.getResponseBody()), 'r') as f:
+            self.assertIsNone(f.testzip())
+            for rtip in rtips:
+                self.assertIn('%d/data.txt' % rtip['progressive'], f.namelist())
@@ -55,6 +55,7 @@ from globaleaks.sessions import Sessions
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils import security, tempdict, token, utility
+from globaleaks.utils.attachments import get_new_attachment_path, iter_attachments
 from globaleaks.utils.securetempfile import SecureTemporaryFile
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.utility import datetime_null, datetime_now, datetime_to_ISO8601, \
@@ -304,6 +305,17 @@ def forge_request(uri=b'https://www.globaleaks.org/',
 
     request.notifyFinish = notifyFinish
 
+    def registerProducer(producer, streaming):
+        # Streaming producers drive themselves as a real transport would
+        # expect; only pull producers are looped synchronously.
+        request.producer = producer
+        if not streaming:
+            request.go = 1
+            while request.go:
+                producer.resumeProducing()
+
+    request.registerProducer = registerProducer
+
     request.requestHeaders.setRawHeaders('host', [b'127.0.0.1'])
     request.requestHeaders.setRawHeaders('user-agent', [b'NSA Agent'])
 
@@ -477,7 +489,7 @@ class TestGL(unittest.TestCase):
 
         self.dummyNode = dummyStuff.dummyNode
 
-        self.assertEqual(os.listdir(Settings.attachments_path), [])
+        self.assertEqual(list(iter_attachments()), [])
         self.assertEqual(os.listdir(Settings.tmp_path), [])
 
     def get_dummy_user(self, role, username):
@@ -578,9 +590,7 @@ class TestGL(unittest.TestCase):
         for _ in range(number_of_times):
             for event_obj in event.events_monitored:
                 for x in range(2):
-                    e = event.Event(event_obj, timedelta(seconds=1.0 * x))
-                    self.state.tenant_state[1].RecentEventQ.append(e)
-                    self.state.tenant_state[1].EventQ.append(e)
+                    event.track_event(1, event_obj, timedelta(seconds=1.0 * x))
 
     @transact
     def get_rtips(self, session):
@@ -727,8 +737,7 @@ class TestGLWithPopulatedDB(TestGL):
             src = os.path.join(Settings.tmp_path,
                                os.path.basename(dummyFile['filename']))
 
-            dst = os.path.join(Settings.attachments_path,
-                               os.path.basename(dummyFile['filename']))
+            dst = get_new_attachment_path(os.path.basename(dummyFile['filename']))
 
             shutil.move(src, dst)
 
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
-from globaleaks import anomaly
+from datetime import timedelta
+
+from globaleaks import anomaly, models
 from globaleaks.jobs import anomalies
+from globaleaks.orm import transact
 from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_now
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -41,3 +45,36 @@ class TestAnomalies(helpers.TestGL):
         # a second time in order test the accept_submissions value
         self.n = -1
         yield anomalies.Anomalies().run()
+
+    @inlineCallbacks
+    def test_anomalies_are_saved_once(self):
+        self.pollute_events(10)
+
+        yield anomalies.Anomalies().run()
+        yield self.test_model_count(models.Anomalies, 1)
+        self.assertEqual(self.state.tenant_state[1].anomalies_watermark, 1)
+
+        yield anomaly.save_anomalies()
+        yield self.test_model_count(models.Anomalies, 1)
+
+        yield anomalies.Anomalies().run()
+        yield self.test_model_count(models.Anomalies, 2)
+
+    @inlineCallbacks
+    def test_prune_anomalies(self):
+        self.patch(self.state.settings, 'anomalies_prune_chunk_size', 3)
+
+        @transact
+        def add_anomalies(session):
+            for i in range(10):
+                a = models.Anomalies()
+                a.tid = 1
+                a.date = datetime_now() - timedelta(days=i)
+                a.alarm = 1
+                a.events = {}
+                session.add(a)
+
+        yield add_anomalies()
+
+        yield anomaly.prune_anomalies(datetime_now() - timedelta(days=2, hours=1))
+        yield self.test_model_count(models.Anomalies, 3)
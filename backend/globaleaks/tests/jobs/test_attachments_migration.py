@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+
+from globaleaks.jobs import attachments_migration
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils import attachments
+from twisted.internet.defer import inlineCallbacks
+
+
+class TestAttachmentsMigration(helpers.TestGL):
+    @inlineCallbacks
+    def test_migration(self):
+        filenames = ['file-%d.plain' % i for i in range(5)]
+        for filename in filenames:
+            with open(os.path.join(Settings.attachments_path, filename), 'w') as f:
+                f.write(filename)
+
+        # Flat files are still resolved while the migration is pending
+        for filename in filenames:
+            self.assertEqual(attachments.get_attachment_path(filename),
+                             os.path.join(Settings.attachments_path, filename))
+
+        job = attachments_migration.AttachmentsMigration()
+        job.batch_size = 2
+
+        for _ in range(3):
+            yield job.run()
+            self.assertFalse(job.completed)
+
+        yield job.run()
+        self.assertTrue(job.completed)
+
+        self.assertEqual(attachments.list_flat_attachments(), [])
+        self.assertEqual(sorted(f for f, _ in attachments.iter_attachments()), filenames)
+
+        for filename in filenames:
+            path = attachments.get_attachment_path(filename)
+            self.assertEqual(path, attachments.sharded_path(filename))
+            with open(path, 'r') as f:
+                self.assertEqual(f.read(), filename)
+
+    @inlineCallbacks
+    def test_migration_conflicts(self):
+        for filename, content in (('same.plain', 'same'), ('different.plain', 'flat')):
+            with open(attachments.flat_path(filename), 'w') as f:
+                f.write(content)
+
+            with open(attachments.get_new_attachment_path(filename), 'w') as f:
+                f.write(content if filename == 'same.plain' else 'sharded')
+
+        job = attachments_migration.AttachmentsMigration()
+
+        yield job.run()
+        yield job.run()
+        self.assertTrue(job.completed)
+
+        # the redundant flat copy is removed while the conflicting one is kept
+        self.assertEqual(attachments.list_flat_attachments(), ['different.plain'])
+        with open(attachments.get_attachment_path('different.plain'), 'r') as f:
+            self.assertEqual(f.read(), 'sharded')
+
+    def test_open_attachment(self):
+        filename = 'moved.plain'
+        path = attachments.flat_path(filename)
+        with open(path, 'w') as f:
+            f.write(filename)
+
+        # the file is moved after the resolution of its path
+        attachments.migrate_attachment(filename)
+
+        with attachments.open_attachment(path) as f:
+            self.assertEqual(f.read(), filename.encode())
+
+    def test_remove_empty_shard_dirs(self):
+        path = attachments.get_new_attachment_path('deleted.plain')
+        shard = os.path.dirname(path)
+
+        # the directories just created are kept
+        attachments.remove_empty_shard_dirs(min_age=3600)
+        self.assertTrue(os.path.isdir(shard))
+
+        open(path, 'w').close()
+        attachments.remove_empty_shard_dirs(min_age=0)
+        self.assertTrue(os.path.isdir(shard))
+
+        os.remove(path)
+        attachments.remove_empty_shard_dirs(min_age=0)
+        self.assertFalse(os.path.exists(os.path.dirname(shard)))
@@ -2,18 +2,19 @@
 import os
 
 from globaleaks import models
-from globaleaks.jobs import daily, delivery
+from globaleaks.jobs import daily, delivery, secure_file_deletion
 from globaleaks.orm import transact
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.tests import helpers
+from globaleaks.utils.attachments import iter_attachments
 from twisted.internet.defer import inlineCallbacks
 
 
 class TestDaily(helpers.TestGLWithPopulatedDB):
     @transact
     def check0(self, session):
-        self.assertTrue(os.listdir(Settings.attachments_path) == [])
+        self.assertTrue(list(iter_attachments()) == [])
         self.assertTrue(os.listdir(Settings.tmp_path) == [])
 
         self.db_test_model_count(session, models.InternalTip, 0)
@@ -27,7 +28,7 @@ class TestDaily(helpers.TestGLWithPopulatedDB):
 
     @transact
     def check1(self, session):
-        self.assertTrue(os.listdir(Settings.attachments_path) != [])
+        self.assertTrue(list(iter_attachments()) != [])
 
         self.db_test_model_count(session, models.InternalTip, self.population_of_submissions)
         self.db_test_model_count(session, models.ReceiverTip, self.population_of_recipients * self.population_of_submissions)
@@ -40,7 +41,7 @@ class TestDaily(helpers.TestGLWithPopulatedDB):
 
     @transact
     def check2(self, session):
-        self.assertTrue(os.listdir(Settings.attachments_path) != [])
+        self.assertTrue(list(iter_attachments()) != [])
 
         self.db_test_model_count(session, models.InternalTip, self.population_of_submissions)
         self.db_test_model_count(session, models.ReceiverTip, self.population_of_recipients * self.population_of_submissions)
@@ -53,7 +54,7 @@ class TestDaily(helpers.TestGLWithPopulatedDB):
 
     @transact
     def check3(self, session):
-        self.assertTrue(os.listdir(Settings.attachments_path) != [])
+        self.assertTrue(list(iter_attachments()) != [])
 
         self.db_test_model_count(session, models.InternalTip, self.population_of_submissions)
         self.db_test_model_count(session, models.ReceiverTip, self.population_of_recipients * self.population_of_submissions)
@@ -66,7 +67,7 @@ class TestDaily(helpers.TestGLWithPopulatedDB):
 
     @transact
     def check4(self, session):
-        self.assertTrue(os.listdir(Settings.attachments_path) == [])
+        self.assertTrue(list(iter_attachments()) == [])
         self.assertTrue(os.listdir(Settings.tmp_path) == [])
 
         self.db_test_model_count(session, models.InternalTip, 0)
@@ -123,6 +124,11 @@ class TestDaily(helpers.TestGLWithPopulatedDB):
 
         yield daily.Daily().run()
 
+        # perform the secure deletion of the files of the expired tips
+        job = secure_file_deletion.SecureFileDeletion()
+        yield job.run()
+        yield job.stop()
+
         # verify cascade deletion when tips expire
         yield self.check4()
 
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks import models
+from globaleaks.jobs import secure_file_deletion
+from globaleaks.orm import transact
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_now, datetime_null
+
+
+class TestSecureFileDeletion(helpers.TestGL):
+    @transact
+    def mark_file_for_secure_deletion(self, session, filepath):
+        secure_file_delete = models.SecureFileDelete()
+        secure_file_delete.filepath = filepath
+        session.add(secure_file_delete)
+
+    @transact
+    def get_attempts(self, session):
+        x = session.query(models.SecureFileDelete).one()
+        return x.attempts, x.next_try
+
+    @transact
+    def set_attempts(self, session, attempts):
+        x = session.query(models.SecureFileDelete).one()
+        x.attempts = attempts
+        x.next_try = datetime_null()
+
+    @inlineCallbacks
+    def test_secure_file_deletion(self):
+        path = os.path.join(Settings.attachments_path, 'secure_file_deletion.txt')
+        with open(path, 'wb') as f:
+            f.write(b'antani' * 1000)
+
+        yield self.mark_file_for_secure_deletion(path)
+
+        job = secure_file_deletion.SecureFileDeletion()
+        overwrite = secure_file_deletion.overwrite
+
+        def failing_overwrite(*args, **kwargs):
+            raise IOError("Input/output error")
+
+        # a failed deletion keeps the file and its entry to be retried later
+        secure_file_deletion.overwrite = failing_overwrite
+        try:
+            yield job.run()
+        finally:
+            secure_file_deletion.overwrite = overwrite
+
+        self.assertTrue(os.path.exists(path))
+        attempts, next_try = yield self.get_attempts()
+        self.assertEqual(attempts, 1)
+        self.assertTrue(next_try > datetime_now())
+
+        # the entry is skipped until its next attempt
+        yield job.run()
+        self.assertTrue(os.path.exists(path))
+
+        # the entries that reached the maximum of attempts are not served anymore
+        yield self.set_attempts(Settings.secure_file_delete_max_attempts)
+        yield job.run()
+        self.assertTrue(os.path.exists(path))
+
+        yield self.set_attempts(1)
+        yield job.run()
+        self.assertFalse(os.path.exists(path))
+        yield self.test_model_count(models.SecureFileDelete, 0)
+
+        yield job.stop()
+        self.assertFalse(job.threadpool.started)
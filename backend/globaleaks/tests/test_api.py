@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+from datetime import timedelta
+
 from twisted.internet.address import IPv4Address
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks.db import refresh_memory_variables
+from globaleaks.event import track_handler
 from globaleaks.handlers.admin.node import update_enabled_languages
 from globaleaks.state import State
 from globaleaks.tests.helpers import TestGL, forge_request
@@ -97,6 +100,30 @@ class TestAPI(TestGL):
                 returnedHeaderValue = request.responseHeaders.getRawHeaders(headerName)[0]
                 self.assertEqual(returnedHeaderValue, expectedHeaderValue)
 
+    def test_monitored_events(self):
+        from globaleaks.handlers.authentication import AuthenticationHandler, SessionHandler
+
+        self.assertEqual([e['name'] for e in AuthenticationHandler.monitored_events[b'POST']],
+                         ['failed_logins', 'successful_logins'])
+        self.assertEqual(SessionHandler.monitored_events, {})
+
+        from globaleaks.handlers.attachment import SubmissionAttachment, PostSubmissionAttachment
+        from globaleaks.handlers.token import TokenCreate
+
+        # the subclasses of a handler have their own map
+        self.assertTrue('monitored_events' in PostSubmissionAttachment.__dict__)
+        self.assertEqual(PostSubmissionAttachment.monitored_events, SubmissionAttachment.monitored_events)
+
+        self.assertEqual([e['name'] for e in TokenCreate.monitored_events[b'POST']], ['started_submissions'])
+
+        request = forge_request(b'https://www.globaleaks.org/authentication', method=b'POST')
+        request.tid = 1
+        request.code = 401
+        request.execution_time = timedelta(seconds=1)
+
+        track_handler(AuthenticationHandler(State, request))
+        self.assertEqual(State.tenant_state[1].EventCounter.get_totals(), {'failed_logins': 1})
+
     def test_request_state(self):
         url = b"https://www.globaleaks.org/"
 
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+from globaleaks import db
+from globaleaks.tests import helpers
+from globaleaks.utils.attachments import get_new_attachment_path, iter_attachments
+from twisted.internet.defer import inlineCallbacks
+
+
+class TestCleanUntrackedFiles(helpers.TestGLWithPopulatedDB):
+    @inlineCallbacks
+    def test_clean_untracked_files(self):
+        yield self.perform_full_submission_actions()
+
+        tracked_files = yield db.get_tracked_files()
+        stored_files = [path for f, path in iter_attachments() if f in tracked_files]
+        self.assertTrue(len(stored_files) > 0)
+
+        old_untracked_file = get_new_attachment_path('old-untracked.plain')
+        new_untracked_file = get_new_attachment_path('new-untracked.plain')
+
+        for path in [old_untracked_file, new_untracked_file]:
+            with open(path, 'w') as f:
+                f.write('antani')
+
+        threshold = time.time()
+        os.utime(old_untracked_file, (threshold - 60, threshold - 60))
+        os.utime(new_untracked_file, (threshold + 60, threshold + 60))
+
+        yield db.clean_untracked_files(threshold)
+
+        self.assertFalse(os.path.exists(old_untracked_file))
+        self.assertTrue(os.path.exists(new_untracked_file))
+
+        for path in stored_files:
+            self.assertTrue(os.path.exists(path))
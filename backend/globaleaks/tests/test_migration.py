@@ -7,6 +7,7 @@ for each version one an empty and a populated db must be sessiond in directories
 """
 import os
 import shutil
+from datetime import datetime
 
 from twisted.trial import unittest
 
@@ -89,6 +90,33 @@ class TestMigrationRoutines(unittest.TestCase):
         self.assertEqual(saved_key, pk)
         session.close()
 
+    def preconditions_44(self):
+        session = get_session(make_db_uri(self.final_db_file))
+        for day, hour in [(1, 10), (1, 11), (2, 10), (9, 10)]:
+            stats = models.Stats()
+            stats.tid = 1
+            stats.start = datetime(2018, 10, day, hour)
+            stats.summary = {'failed_logins': 1, 'files': 2}
+            session.add(stats)
+        session.commit()
+        session.close()
+
+    def postconditions_44(self):
+        session = get_session(make_db_uri(self.final_db_file))
+
+        def count(period, start, event):
+            return session.query(models.StatsRollup.count) \
+                          .filter(models.StatsRollup.tid == 1,
+                                  models.StatsRollup.period == period,
+                                  models.StatsRollup.start == start,
+                                  models.StatsRollup.event == event).one()[0]
+
+        self.assertEqual(count(u'day', datetime(2018, 10, 1), u'failed_logins'), 2)
+        self.assertEqual(count(u'day', datetime(2018, 10, 2), u'files'), 2)
+        self.assertEqual(count(u'week', datetime(2018, 10, 1), u'failed_logins'), 3)
+        self.assertEqual(count(u'week', datetime(2018, 10, 8), u'files'), 2)
+        session.close()
+
 
 def test(path, version):
     return lambda self: self._test(path, version)
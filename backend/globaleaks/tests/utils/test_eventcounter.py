@@ -0,0 +1,27 @@
+from twisted.trial import unittest
+
+from globaleaks.utils.eventcounter import EventCounter
+
+
+class TestEventCounter(unittest.TestCase):
+    def test_increment_and_window(self):
+        counter = EventCounter(bucket_size=60, buckets_count=60)
+
+        for i in range(120):
+            counter.increment('login', now=i * 60)
+
+        counter.increment('submission', now=119 * 60)
+
+        self.assertEqual(counter.window(now=119 * 60), {'login': 60, 'submission': 1})
+        self.assertEqual(counter.window(seconds=600, now=119 * 60), {'login': 10, 'submission': 1})
+        self.assertEqual(counter.window(now=200 * 60), {})
+        self.assertEqual(counter.get_totals(), {'login': 120, 'submission': 1})
+
+    def test_bucket_reuse(self):
+        counter = EventCounter(bucket_size=1, buckets_count=2)
+
+        counter.increment('login', now=0)
+        counter.increment('login', now=2)
+
+        self.assertEqual(counter.window(now=2), {'login': 1})
+        self.assertEqual(counter.get_totals(), {'login': 2})
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import os
+import shutil
+import stat
+import tempfile
+
+from twisted.internet import reactor, protocol, ssl
+from twisted.internet.address import IPv4Address
+from twisted.internet.endpoints import SSL4ClientEndpoint, connectProtocol
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.task import deferLater
+from twisted.trial import unittest
+from twisted.protocols.tls import TLSMemoryBIOFactory
+from twisted.web import resource, server
+from twisted.web.client import Agent, FileBodyProducer, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+
+from globaleaks.tests import helpers
+from globaleaks.utils.httpsproxy import H2_ENABLED, HTTPStreamChannel, HTTPStreamFactory, HTTPStreamProtocol, HTTPStreamProxyRequest
+from globaleaks.utils.sni import SNIMap
+from globaleaks.utils.sock import listen_unix_on_sock, reserve_unix_socket
+from globaleaks.utils.staticcache import StaticFileCache, gzip_decompress
+from globaleaks.utils.tls import TLSServerContextFactory
+
+if H2_ENABLED:
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.events import DataReceived, ResponseReceived, StreamEnded
+
+
+DOWNLOAD_SIZE = 32 * 1024 * 1024
+
+
+class EchoResource(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b'X-Frame-Options', b'deny')
+
+        if request.path == b'/download':
+            return b'x' * DOWNLOAD_SIZE
+
+        return request.getHeader(b'GL-Forwarded-For')
+
+    def render_POST(self, request):
+        return hashlib.sha256(request.content.read()).hexdigest().encode()
+
+
+class SlowClient(protocol.Protocol):
+    def __init__(self):
+        self.received = 0
+        self.finished = Deferred()
+
+    def connectionMade(self):
+        self.transport.write(b'GET /download HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+        self.transport.pauseProducing()
+
+    def dataReceived(self, data):
+        self.received += len(data)
+
+    def connectionLost(self, reason):
+        self.finished.callback(None)
+
+
+class AbortingClient(SlowClient):
+    def connectionMade(self):
+        self.transport.write(b'GET /download HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+
+    def dataReceived(self, data):
+        SlowClient.dataReceived(self, data)
+        self.transport.abortConnection()
+
+
+class H2Client(protocol.Protocol):
+    """
+    Client sending a single request on a HTTP/2 connection
+    """
+    def __init__(self, headers, body):
+        self.headers = headers
+        self.body = body
+        self.negotiated_protocol = None
+        self.status = None
+        self.data = b''
+        self.finished = Deferred()
+        self.conn = H2Connection(H2Configuration(client_side=True))
+
+    def connectionMade(self):
+        self.conn.initiate_connection()
+        self.conn.send_headers(1, self.headers)
+
+        # the body is smaller than the initial flow control window
+        # and is sent in frames of the default maximum size
+        for i in range(0, len(self.body), 16384):
+            self.conn.send_data(1, self.body[i:i + 16384])
+
+        self.conn.end_stream(1)
+        self.transport.write(self.conn.data_to_send())
+
+    def dataReceived(self, data):
+        self.negotiated_protocol = self.transport.negotiatedProtocol
+
+        for event in self.conn.receive_data(data):
+            if isinstance(event, ResponseReceived):
+                self.status = dict(event.headers)[b':status']
+            elif isinstance(event, DataReceived):
+                self.data += event.data
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, StreamEnded):
+                self.transport.loseConnection()
+                self.finished.callback(None)
+
+        self.transport.write(self.conn.data_to_send())
+
+
+class FakeAgent(object):
+    def __init__(self):
+        self.requests = []
+
+    def request(self, **kwargs):
+        self.requests.append(kwargs)
+        return Deferred()
+
+
+class FakeStream(object):
+    command = b'POST'
+    path = b'/path'
+    transport = None
+
+    def __init__(self, factory, agent):
+        self.factory = FakeFactory(factory.proxy_url, agent)
+
+    def getPeer(self):
+        return IPv4Address('TCP', '127.0.0.1', 12345)
+
+    def getHost(self):
+        return IPv4Address('TCP', '127.0.0.1', 443)
+
+
+class FakeFactory(object):
+    static_cache = None
+    tenant_headers = {}
+
+    def __init__(self, proxy_url, agent):
+        self.proxy_url = proxy_url
+        self.http_agent = agent
+
+
+class TestHTTPStreamProxy(unittest.TestCase):
+    def listen_backend(self):
+        self.backend_port = reactor.listenTCP(0, server.Site(EchoResource()), interface='127.0.0.1')
+
+        return HTTPStreamFactory('http://127.0.0.1:%d' % self.backend_port.getHost().port)
+
+    def setUp(self):
+        self.factory = self.listen_backend()
+        self.proxy_port = reactor.listenTCP(0, self.factory, interface='127.0.0.1')
+
+        self.url = b'http://127.0.0.1:%d/' % self.proxy_port.getHost().port
+
+        self.pool = HTTPConnectionPool(reactor)
+        self.agent = Agent(reactor, pool=self.pool)
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.pool.closeCachedConnections()
+        yield self.factory.pool.closeCachedConnections()
+        yield self.proxy_port.stopListening()
+        yield self.backend_port.stopListening()
+
+    @inlineCallbacks
+    def test_get(self):
+        for _ in range(3):
+            response = yield self.agent.request(b'GET', self.url)
+            body = yield readBody(response)
+            self.assertEqual(response.code, 200)
+            self.assertEqual(body, b'127.0.0.1')
+            self.assertEqual(response.headers.getRawHeaders(b'Strict-Transport-Security'), [b'max-age=31536000'])
+
+        # the connection to the backend is reused
+        self.assertEqual(self.factory.pool.get_stats()['connections'], 1)
+
+    @inlineCallbacks
+    def test_post(self):
+        data = b''.join(hashlib.sha256(str(i).encode()).digest() for i in range(100000))
+
+        producer = FileBodyProducer(io.BytesIO(data), readSize=4096)
+        response = yield self.agent.request(b'POST', self.url, Headers(), producer)
+        body = yield readBody(response)
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(body, hashlib.sha256(data).hexdigest().encode())
+
+    @inlineCallbacks
+    def test_backend_unreachable(self):
+        yield self.backend_port.stopListening()
+
+        producer = FileBodyProducer(io.BytesIO(b'x' * 100000))
+        response = yield self.agent.request(b'POST', self.url, Headers(), producer)
+        yield readBody(response)
+
+        self.assertEqual(response.code, 502)
+
+    def test_http2_disabled(self):
+        self.assertTrue(isinstance(self.factory.buildProtocol(None), HTTPStreamChannel))
+
+        # the connections switch to HTTP/2 only if it has been negotiated
+        factory = HTTPStreamFactory(self.factory.proxy_url, http2=True)
+        self.assertEqual(factory.http2, H2_ENABLED)
+        if H2_ENABLED:
+            self.assertTrue(isinstance(factory.buildProtocol(None), HTTPStreamProtocol))
+
+    def test_http2_stream_headers(self):
+        agent = FakeAgent()
+        stream = FakeStream(self.factory, agent)
+        request = HTTPStreamProxyRequest(stream)
+
+        # the streams convert the Content-Length header before the following ones
+        request.gotLength(4)
+        request.requestHeaders.setRawHeaders(b'X-Header', [b'value'])
+        self.assertEqual(agent.requests, [])
+
+        request.parseCookies()
+        self.assertEqual(agent.requests[0]['uri'], self.factory.proxy_url.encode('utf-8') + b'/path')
+        self.assertEqual(agent.requests[0]['headers'].getRawHeaders(b'X-Header'), [b'value'])
+
+    @inlineCallbacks
+    def test_slow_download(self):
+        client = yield protocol.ClientCreator(reactor, SlowClient).connectTCP('127.0.0.1', self.proxy_port.getHost().port)
+
+        yield deferLater(reactor, 1, lambda: None)
+
+        # the backend connection is paused while the client is not reading
+        self.assertTrue(self.factory.get_stats()['buffered_bytes'] < 1024 * 1024)
+
+        client.transport.resumeProducing()
+        yield client.finished
+
+        self.assertTrue(client.received > DOWNLOAD_SIZE)
+
+    @inlineCallbacks
+    def test_aborted_download(self):
+        client = yield protocol.ClientCreator(reactor, AbortingClient).connectTCP('127.0.0.1', self.proxy_port.getHost().port)
+        yield client.finished
+
+        yield deferLater(reactor, 1, lambda: None)
+
+        # the download from the backend is stopped and the proxy keeps serving
+        self.assertTrue(client.received < DOWNLOAD_SIZE)
+        self.assertEqual(self.factory.get_stats()['active_connections'], 0)
+        self.assertEqual(self.factory.get_stats()['buffered_bytes'], 0)
+
+        response = yield self.agent.request(b'GET', self.url)
+        body = yield readBody(response)
+        self.assertEqual(body, b'127.0.0.1')
+
+
+class TestHTTPStreamProxyUNIX(TestHTTPStreamProxy):
+    def listen_backend(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'backend.sock')
+        self.sock, _ = reserve_unix_socket(self.path)
+        self.backend_port = listen_unix_on_sock(reactor, self.sock.fileno(), server.Site(EchoResource()))
+
+        return HTTPStreamFactory('http://127.0.0.1:8082', proxy_socket=self.path)
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield TestHTTPStreamProxy.tearDown(self)
+        self.sock.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_socket(self):
+        # the socket is accessible only by its owner and its file is kept
+        # when a process sharing it stops listening
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        d = self.backend_port.stopListening()
+        self.assertTrue(os.path.exists(self.path))
+        return d
+
+
+class TestHTTPStreamProxyStaticCache(TestHTTPStreamProxy):
+    def listen_backend(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmpdir, 'js'))
+        with open(os.path.join(self.tmpdir, 'js', 'scripts.js'), 'wb') as f:
+            f.write(b'var x = 1;\n' * 1000)
+
+        factory = TestHTTPStreamProxy.listen_backend(self)
+        factory.static_cache = StaticFileCache(self.tmpdir)
+        return factory
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield TestHTTPStreamProxy.tearDown(self)
+        shutil.rmtree(self.tmpdir)
+
+    @inlineCallbacks
+    def test_static_file(self):
+        url = self.url + b'js/scripts.js'
+
+        # the cached files are served only for the hostnames known by the backend
+        response = yield self.agent.request(b'GET', url)
+        body = yield readBody(response)
+        self.assertEqual(body, b'127.0.0.1')
+        self.assertEqual(self.factory.static_cache.hits, 0)
+
+        # the cached files are served also when the backend is not reachable
+        yield self.backend_port.stopListening()
+        yield self.factory.pool.closeCachedConnections()
+
+        response = yield self.agent.request(b'GET', url)
+        body = yield readBody(response)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(body, b'var x = 1;\n' * 1000)
+        self.assertEqual(response.headers.getRawHeaders(b'Cache-control'), [b'no-cache, no-store, must-revalidate'])
+        self.assertEqual(response.headers.getRawHeaders(b'X-Frame-Options'), [b'deny'])
+
+        response = yield self.agent.request(b'GET', url, Headers({b'Accept-Encoding': [b'gzip']}))
+        body = yield readBody(response)
+        self.assertEqual(response.headers.getRawHeaders(b'Content-Encoding'), [b'gzip'])
+        self.assertEqual(gzip_decompress(body), b'var x = 1;\n' * 1000)
+
+        # the other paths are forwarded to the backend
+        response = yield self.agent.request(b'GET', self.url + b'js/other.js')
+        yield readBody(response)
+        self.assertEqual(response.code, 502)
+
+        self.assertEqual(self.factory.get_stats()['static_requests'], 2)
+
+
+class TestHTTPStreamProxyHTTP2(unittest.TestCase):
+    if not H2_ENABLED:
+        skip = "the h2 library is not installed"
+
+    def setUp(self):
+        self.backend_port = reactor.listenTCP(0, server.Site(EchoResource()), interface='127.0.0.1')
+
+        self.factory = HTTPStreamFactory('http://127.0.0.1:%d' % self.backend_port.getHost().port, http2=True)
+
+        tls_files = {}
+        for name in ['priv_key', 'cert', 'chain', 'dh_params']:
+            with open(os.path.join(helpers.DATA_DIR, 'https', 'valid', name + '.pem'), 'r') as f:
+                tls_files[name] = f.read()
+
+        context_factory = TLSServerContextFactory(tls_files['priv_key'],
+                                                  tls_files['cert'],
+                                                  tls_files['chain'],
+                                                  tls_files['dh_params'])
+
+        snimap = SNIMap({'DEFAULT': context_factory}, protocols=[b'h2', b'http/1.1'])
+
+        self.proxy_port = reactor.listenTCP(0, TLSMemoryBIOFactory(snimap, False, self.factory), interface='127.0.0.1')
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.factory.pool.closeCachedConnections()
+        yield self.proxy_port.stopListening()
+        yield self.backend_port.stopListening()
+
+    @inlineCallbacks
+    def post(self, data, headers):
+        client = H2Client([(b':method', b'POST'),
+                           (b':path', b'/'),
+                           (b':authority', b'127.0.0.1'),
+                           (b':scheme', b'https')] + headers, data)
+
+        options = ssl.CertificateOptions(verify=False, acceptableProtocols=[b'h2'])
+        endpoint = SSL4ClientEndpoint(reactor, '127.0.0.1', self.proxy_port.getHost().port, options)
+
+        yield connectProtocol(endpoint, client)
+        yield client.finished
+
+        self.assertEqual(client.negotiated_protocol, b'h2')
+        self.assertEqual(client.status, b'200')
+        self.assertEqual(client.data, hashlib.sha256(data).hexdigest().encode())
+
+    def test_post(self):
+        data = os.urandom(60000)
+        return self.post(data, [(b'content-length', str(len(data)).encode())])
+
+    def test_post_without_length(self):
+        # the body is streamed to the backend with the chunked encoding
+        return self.post(os.urandom(60000), [])
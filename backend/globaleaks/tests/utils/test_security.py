@@ -4,7 +4,8 @@ import os
 from twisted.trial import unittest
 
 from globaleaks.rest import errors
-from globaleaks.utils.security import generateRandomSalt, hash_password, check_password, directory_traversal_check
+from globaleaks.utils.security import generateRandomSalt, hash_password, check_password, directory_traversal_check, \
+    _overwrite, overwrite_and_remove
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
 
@@ -48,4 +49,25 @@ class TestFilesystemAccess(helpers.TestGL):
 
     def test_directory_traversal_check_allowed(self):
         valid_access = os.path.join(Settings.files_path, "valid.txt")
-        directory_traversal_check(Settings.files_path, valid_access)
\ No newline at end of file
+        directory_traversal_check(Settings.files_path, valid_access)
+
+class TestSecureDeletion(helpers.TestGL):
+    def test_overwrite(self):
+        path = os.path.join(Settings.tmp_path, 'overwrite.txt')
+        with open(path, 'wb') as f:
+            f.write(b'antani' * 100000)
+
+        _overwrite(path, b'\x00' * 4096, 600000)
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'\x00' * 600000)
+
+    def test_overwrite_and_remove(self):
+        path = os.path.join(Settings.tmp_path, 'overwrite_and_remove.txt')
+        with open(path, 'wb') as f:
+            f.write(b'antani' * 100000)
+
+        elapsed = overwrite_and_remove(path, rate_limit=10000000)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(elapsed >= 0)
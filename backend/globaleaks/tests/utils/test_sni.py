@@ -0,0 +1,118 @@
+from globaleaks.tests import helpers
+from globaleaks.utils.sni import SNIMap
+from globaleaks.utils.tls import new_tls_server_context
+
+
+class FakeContextFactory(object):
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.ctx = new_tls_server_context()
+
+    def getContext(self):
+        return self.ctx
+
+
+class FakeConnection(object):
+    def __init__(self, servername, context):
+        self.servername = servername
+        self.context = context
+
+    def get_servername(self):
+        return self.servername
+
+    def get_context(self):
+        return self.context
+
+    def set_context(self, context):
+        self.context = context
+
+
+class TestSNIMap(helpers.TestGL):
+    def setUp(self):
+        helpers.TestGL.setUp(self)
+
+        self.built = []
+        self.mapping = {'DEFAULT': {}}
+        for hostname in ['a.example.org', 'b.example.org', 'c.example.org', 'invalid.example.org']:
+            self.mapping[hostname] = {'hostname': hostname}
+
+        self.snimap = SNIMap(self.mapping, self.build, 2)
+
+    def build(self, site_cfg):
+        hostname = site_cfg.get('hostname', 'DEFAULT')
+        if hostname == 'invalid.example.org':
+            raise Exception('invalid')
+
+        self.built.append(hostname)
+
+        return FakeContextFactory(hostname)
+
+    def handshake(self, servername):
+        connection = FakeConnection(servername, self.snimap.context)
+        self.snimap.selectContext(connection)
+        return connection.context
+
+    def test_lazy_build(self):
+        self.assertEqual(self.built, ['DEFAULT'])
+
+        ctx = self.handshake('a.example.org')
+        self.assertEqual(self.built, ['DEFAULT', 'a.example.org'])
+        self.assertTrue(ctx is self.snimap.contexts['a.example.org'].getContext())
+
+        # the context is reused by the following handshakes
+        self.assertTrue(self.handshake('a.example.org') is ctx)
+        self.assertEqual(self.built, ['DEFAULT', 'a.example.org'])
+        self.assertTrue('a.example.org' in self.snimap.build_times)
+
+    def test_lru(self):
+        self.handshake('a.example.org')
+        self.handshake('b.example.org')
+        self.handshake('a.example.org')
+        self.handshake('c.example.org')
+
+        # b is the least recently used and is evicted
+        self.assertEqual(list(self.snimap.contexts), ['a.example.org', 'c.example.org'])
+
+        self.handshake('b.example.org')
+        self.assertEqual(self.built, ['DEFAULT', 'a.example.org', 'b.example.org', 'c.example.org', 'b.example.org'])
+
+    def test_fallback_to_default(self):
+        self.assertTrue(self.handshake('unknown.example.org') is self.snimap.context)
+        self.assertTrue(self.handshake(None) is self.snimap.context)
+
+        self.assertTrue(self.handshake('invalid.example.org') is self.snimap.context)
+        self.assertFalse('invalid.example.org' in self.mapping)
+
+    def test_update_sites(self):
+        ctx = self.handshake('a.example.org')
+
+        # the context of an updated site is rebuilt on the next handshake
+        self.snimap.setSite('a.example.org', {'hostname': 'a.example.org'})
+        self.assertFalse(self.handshake('a.example.org') is ctx)
+
+        self.snimap.setSite('d.example.org', {'hostname': 'd.example.org'})
+        self.assertFalse(self.handshake('d.example.org') is self.snimap.context)
+
+        self.snimap.removeSite('d.example.org')
+        self.assertTrue(self.handshake('d.example.org') is self.snimap.context)
+
+        default = self.snimap.context
+        self.snimap.setDefault({})
+        self.assertFalse(self.snimap.context is default)
+        self.assertTrue(self.handshake('unknown.example.org') is self.snimap.context)
+
+    def test_alpn(self):
+        snimap = SNIMap(self.mapping, self.build, 2, [b'h2', b'http/1.1'])
+
+        self.assertEqual(snimap.selectProtocol(None, [b'http/1.1', b'h2']), b'h2')
+        self.assertEqual(snimap.selectProtocol(None, [b'http/1.1']), b'http/1.1')
+        self.assertEqual(snimap.selectProtocol(None, [b'spdy/3']), b'')
+
+        # the protocols are offered also by the contexts selected by SNI
+        connection = FakeConnection('a.example.org', snimap.context)
+        snimap.selectContext(connection)
+        self.assertFalse(connection.context is snimap.context)
+        self.assertTrue(connection.context._alpn_select_callback is not None)
+
+        # no protocol is offered if none is specified
+        self.assertTrue(self.handshake('a.example.org')._alpn_select_callback is None)
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+
+from globaleaks.tests import helpers
+from globaleaks.utils.staticcache import StaticFileCache, gzip_compress, gzip_decompress
+
+
+def write_client_files(path, files):
+    for filename, data in files.items():
+        filepath = os.path.join(path, filename)
+        if not os.path.exists(os.path.dirname(filepath)):
+            os.makedirs(os.path.dirname(filepath))
+
+        with open(filepath, 'wb') as f:
+            f.write(data)
+
+
+class TestStaticFileCache(helpers.TestGL):
+    def setUp(self):
+        helpers.TestGL.setUp(self)
+
+        self.scripts = b'var x = 1;\n' * 1000
+
+        self.path = tempfile.mkdtemp()
+        write_client_files(self.path, {
+            'index.html': b'<html></html>',
+            'js/scripts.js': self.scripts,
+            'js/scripts.js.gz': gzip_compress(self.scripts),
+            'js/plugin.js.gz': gzip_compress(self.scripts),
+            'data/logo.png': b'\x89PNG',
+            'data/templates/page.html': b'<div></div>',
+            'l10n/en.json': b'{"a": "b"}' * 100
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return helpers.TestGL.tearDown(self)
+
+    def test_load(self):
+        cache = StaticFileCache(self.path)
+
+        self.assertEqual(sorted(cache.entries), [b'/data/logo.png', b'/js/plugin.js', b'/js/scripts.js'])
+
+        # the precompressed variants are used and the missing ones are created
+        for path in [b'/js/plugin.js', b'/js/scripts.js']:
+            entry = cache.get(path)
+            self.assertEqual(gzip_decompress(entry['gzip']), entry['identity'])
+
+        self.assertEqual(cache.get(b'/js/plugin.js')['identity'], self.scripts)
+        self.assertEqual(cache.get(b'/data/logo.png')['content_type'], b'image/png')
+
+        # the files that do not shrink are kept only uncompressed
+        self.assertEqual(cache.get(b'/data/logo.png')['gzip'], None)
+
+        self.assertEqual(cache.get(b'/index.html'), None)
+        self.assertEqual(cache.get(b'/l10n/en.json'), None)
+        self.assertEqual(cache.hits, 5)
+
+    def test_size_limit(self):
+        cache = StaticFileCache(self.path, len(self.scripts))
+
+        self.assertTrue(cache.size <= len(self.scripts))
+        self.assertEqual(cache.get(b'/js/scripts.js'), None)
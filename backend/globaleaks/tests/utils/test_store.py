@@ -0,0 +1,220 @@
+import os
+import sqlite3
+
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.handlers.submission import SubmissionInstance
+from globaleaks.rest import errors
+from globaleaks.sessions import Session, Sessions
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.store import MemoryStore, SQLiteStore
+from globaleaks.utils.token import Token, TokenList
+
+
+class FakeClock(object):
+    now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryStore(helpers.TestGL):
+    def get_store(self, clock):
+        return MemoryStore(clock)
+
+    def setUp(self):
+        helpers.TestGL.setUp(self)
+        self.clock = FakeClock()
+        self.store = self.get_store(self.clock)
+
+    def tearDown(self):
+        self.store.close()
+        return helpers.TestGL.tearDown(self)
+
+    def test_ttl(self):
+        self.store.set(u'ns', u'a', {'x': 1}, 10)
+        self.assertEqual(self.store.get(u'ns', u'a'), {'x': 1})
+        self.assertEqual(self.store.get(u'other', u'a'), None)
+
+        self.clock.now += 5
+        self.assertEqual(self.store.get(u'ns', u'a', 10), {'x': 1})
+
+        self.clock.now += 9
+        self.assertEqual(self.store.get(u'ns', u'a'), {'x': 1})
+
+        self.clock.now += 1
+        self.assertEqual(self.store.get(u'ns', u'a'), None)
+
+    def test_consume(self):
+        self.store.set(u'ns', u'a', 1, 10)
+        self.assertEqual(self.store.consume(u'ns', u'a'), 1)
+        self.assertEqual(self.store.consume(u'ns', u'a'), None)
+        self.assertEqual(self.store.get(u'ns', u'a'), None)
+
+    def test_copies(self):
+        value = {'x': [1]}
+        self.store.set(u'ns', u'a', value, 10)
+
+        value['x'].append(2)
+        self.assertEqual(self.store.get(u'ns', u'a'), {'x': [1]})
+
+    def test_delete_by(self):
+        self.store.set(u'ns', u'a', 1, 10, 1, u'alice')
+        self.store.set(u'ns', u'b', 2, 10, 1, u'bob')
+        self.store.set(u'ns', u'c', 3, 10, 2, u'alice')
+
+        self.store.delete_by(u'ns', owner=u'alice')
+        self.assertEqual(self.store.get(u'ns', u'a'), None)
+        self.assertEqual(self.store.get(u'ns', u'b'), 2)
+        self.assertEqual(self.store.get(u'ns', u'c'), None)
+
+        self.store.delete_by(u'ns', tid=1)
+        self.assertEqual(self.store.get(u'ns', u'b'), None)
+
+    def test_purge(self):
+        self.store.set(u'ns', u'a', 1, 10)
+        self.store.set(u'ns', u'b', 2, 20)
+
+        self.clock.now += 15
+        self.store.purge()
+
+        self.assertEqual(self.store.consume(u'ns', u'a'), None)
+        self.assertEqual(self.store.get(u'ns', u'b'), 2)
+
+
+class TestSQLiteStore(TestMemoryStore):
+    def get_store(self, clock):
+        return SQLiteStore(os.path.join(Settings.working_path, 'store.db'), clock)
+
+    def tearDown(self):
+        d = TestMemoryStore.tearDown(self)
+        os.remove(os.path.join(Settings.working_path, 'store.db'))
+        return d
+
+    def test_shared_consume(self):
+        other = self.get_store(self.clock)
+
+        self.store.set(u'ns', u'a', 1, 10)
+        self.assertEqual(other.get(u'ns', u'a'), 1)
+        self.assertEqual(other.consume(u'ns', u'a'), 1)
+        self.assertEqual(self.store.consume(u'ns', u'a'), None)
+
+        other.close()
+
+    def test_locked(self):
+        self.store.set(u'ns', u'a', 1, 10)
+
+        # another process keeping the database locked
+        other = sqlite3.connect(os.path.join(Settings.working_path, 'store.db'), isolation_level=None)
+        other.execute('BEGIN EXCLUSIVE')
+
+        self.assertRaises(errors.StoreBusy, self.store.set, u'ns', u'b', 2, 10)
+        self.assertRaises(errors.StoreBusy, self.store.consume, u'ns', u'a')
+
+        other.execute('ROLLBACK')
+        other.close()
+
+        self.assertEqual(self.store.consume(u'ns', u'a'), 1)
+
+
+class TestSharedState(helpers.TestGL):
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestGL.setUp(self)
+        self.store = SQLiteStore(os.path.join(Settings.working_path, 'store.db'))
+        self.patch(Sessions, 'store', self.store)
+        self.patch(TokenList, 'store', self.store)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(os.path.join(Settings.working_path, 'store.db'))
+        return helpers.TestGL.tearDown(self)
+
+    def test_sessions(self):
+        session = Sessions.new(1, u'user', u'admin', False)
+
+        # a session created by another process is loaded from the store
+        Sessions.clear()
+        self.assertEqual(Sessions.get(session.id).user_id, u'user')
+
+        # a session revoked by another process is dropped from the cache
+        self.store.delete_by(u'session', owner=u'user')
+        self.assertEqual(Sessions.get(session.id), None)
+
+    def test_session_regenerate_once(self):
+        session = Sessions.new(1, u'user', u'admin', False)
+        session_id = session.id
+
+        self.assertTrue(Sessions.regenerate(session_id) is not None)
+
+        # the same session token exchanged on another process
+        Sessions.set(session_id, Session(1, u'user', u'admin', False))
+        self.store.delete(u'session', session_id)
+        self.assertEqual(Sessions.regenerate(session_id), None)
+
+    def test_token_claim_once(self):
+        token = Token(1)
+        token.solve()
+
+        TokenList.claim(token)
+        self.assertRaises(errors.TokenFailure, TokenList.claim, token)
+
+        # a claimed token is not dropped while the other processes miss it
+        self.assertRaises(errors.TokenFailure, TokenList.get, token.id)
+        self.assertTrue(token.id in TokenList)
+
+        # the same token claimed on another process
+        TokenList.release(token)
+        self.store.delete(u'token', token.id)
+        self.assertRaises(errors.TokenFailure, TokenList.claim, token)
+
+    def test_token_uploaded_files(self):
+        token = Token(1)
+        self.emulate_file_upload(token, 1)
+
+        # the files and the expiration of the local token are kept
+        token = TokenList.get(token.id)
+        self.assertEqual(len(token.uploaded_files), 1)
+        self.assertTrue(token.expireCall is not None)
+
+    def test_token_release(self):
+        token = Token(1)
+        token.solve()
+
+        TokenList.claim(token)
+        TokenList.release(token)
+
+        # a token released after a failure can be used again also by another process
+        TokenList.clear()
+        token = TokenList.get(token.id)
+        TokenList.claim(token)
+
+
+class TestSharedSubmission(helpers.TestHandlerWithPopulatedDB):
+    _handler = SubmissionInstance
+
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestHandlerWithPopulatedDB.setUp(self)
+        self.store = SQLiteStore(os.path.join(Settings.working_path, 'store.db'))
+        self.patch(Sessions, 'store', self.store)
+        self.patch(TokenList, 'store', self.store)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(os.path.join(Settings.working_path, 'store.db'))
+        return helpers.TestHandlerWithPopulatedDB.tearDown(self)
+
+    @inlineCallbacks
+    def test_put_with_files(self):
+        token = Token(1, 'submission')
+        token.solve()
+        self.emulate_file_upload(token, 2)
+
+        submission_desc = yield self.get_dummy_submission(self.dummyContext['id'])
+        handler = self.request(submission_desc)
+        response = yield handler.put(token.id)
+
+        files = yield self.get_internalfiles_by_receipt(response['receipt'])
+        self.assertEqual(len(files), 2)
@@ -9,6 +9,12 @@ class TestObject(object):
         self.id = obj_id
 
 
+class IndexedTempDict(TempDict):
+    indexes = {
+        'parity': lambda obj: obj.id % 2
+    }
+
+
 def expireCallback(self):
     TestObject.callbacks_count += 1
     if self.id != TestObject.callbacks_count:
@@ -53,3 +59,49 @@ class TestTempDict(helpers.TestGL):
                 self.assertEqual(len(xxx), size_limit)
                 self.assertEqual(xxx.get(x - size_limit + 1).id, x - size_limit + 1)
                 self.assertEqual(xxx.get(x - size_limit), None)
+
+    def test_touch(self):
+        timeout = 10
+
+        xxx = TempDict(timeout=timeout)
+
+        for x in range(1, 1001):
+            xxx.set(x, TestObject(x))
+
+        # a single timer is scheduled for all the entries
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 1)
+
+        for _ in range(timeout * 2):
+            self.test_reactor.advance(1)
+            self.assertEqual(xxx.get(1).id, 1)
+
+        self.assertEqual(len(xxx), 1)
+
+        self.test_reactor.advance(timeout)
+        self.assertEqual(len(xxx), 0)
+        self.assertEqual(self.test_reactor.getDelayedCalls(), [])
+
+    def test_indexes(self):
+        xxx = IndexedTempDict(timeout=10, size_limit=4)
+
+        for x in range(1, 5):
+            xxx.set(x, TestObject(x))
+
+        self.assertEqual(sorted(xxx.lookup('parity', 0)), [2, 4])
+        self.assertEqual(sorted(xxx.lookup('parity', 1)), [1, 3])
+
+        # replacement, deletion and eviction for size limit
+        xxx.set(2, TestObject(5))
+        xxx.delete(3)
+        xxx.pop(4)
+        xxx.set(6, TestObject(6))
+        xxx.set(7, TestObject(7))
+        xxx.set(8, TestObject(8))
+
+        self.assertEqual(sorted(xxx.lookup('parity', 0)), [6, 8])
+        self.assertEqual(sorted(xxx.lookup('parity', 1)), [2, 7])
+
+        # expiration
+        self.test_reactor.advance(11)
+        self.assertEqual(xxx.lookup('parity', 0), [])
+        self.assertEqual(xxx.lookup('parity', 1), [])
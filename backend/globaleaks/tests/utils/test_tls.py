@@ -245,3 +245,14 @@ class TestObjectValidators(TestCase):
             if chain_path == 'invalid/cert_and_chain.pem':
                 self.assertEqual(self.valid_setup['cert'], chain[0])
                 self.assertEqual(self.valid_setup['chain'], chain[1])
+
+
+class TestTLSServerContextFactory(TestCase):
+    def test_session_cache(self):
+        s = get_valid_setup()
+
+        factory = tls.TLSServerContextFactory(s['key'], s['cert'], s['chain'], s['dh_params'], 600)
+
+        ctx = factory.getContext()
+        self.assertEqual(ctx.get_timeout(), 600)
+        self.assertEqual(tls.get_session_cache_stats(ctx), {'accepts': 0, 'hits': 0, 'misses': 0, 'sessions': 0})
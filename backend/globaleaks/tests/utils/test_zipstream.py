@@ -5,7 +5,7 @@ import os
 from six import unichr, binary_type
 
 from twisted.internet.defer import inlineCallbacks
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 from globaleaks.tests import helpers
 from globaleaks.utils.zipstream import ZipStream
@@ -41,3 +41,31 @@ class TestZipStream(helpers.TestGL):
                     self.assertTrue(ff.file_size == len(self.unicode_seq.encode()))
                 else:
                     self.assertTrue(ff.file_size == os.stat(os.path.abspath(__file__)).st_size)
+
+    def test_zipstream_stored_mode(self):
+        output = BytesIO()
+
+        files = [
+          {'name': 'data.txt', 'fo': BytesIO(b'a' * 4096)},
+          {'name': 'file.pgp', 'fo': BytesIO(b'b' * 4096)}
+        ]
+
+        for data in ZipStream(files):
+            output.write(data)
+
+        with ZipFile(output, 'r') as f:
+            self.assertIsNone(f.testzip())
+            self.assertEqual(f.getinfo('data.txt').compress_type, ZIP_DEFLATED)
+            self.assertEqual(f.getinfo('file.pgp').compress_type, ZIP_STORED)
+            self.assertEqual(f.read('file.pgp'), b'b' * 4096)
+
+    def test_zipstream_zip64_file_count(self):
+        output = BytesIO()
+
+        files = ({'name': '%d.txt' % i, 'fo': BytesIO(b'')} for i in range(70000))
+
+        for data in ZipStream(files):
+            output.write(data)
+
+        with ZipFile(output, 'r') as f:
+            self.assertEqual(len(f.infolist()), 70000)
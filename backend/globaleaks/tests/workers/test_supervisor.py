@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
+import signal
 import ssl
 import tempfile
 from six.moves import urllib
@@ -14,6 +15,7 @@ from globaleaks.tests import helpers
 from globaleaks.tests.utils import test_tls
 from globaleaks.utils.sock import reserve_port_for_ip
 from globaleaks.workers import supervisor
+from globaleaks.workers.process import HTTPSProcProtocol, read_cfg
 from globaleaks.workers.worker_https import HTTPSProcess
 
 
@@ -45,6 +47,203 @@ class TestProcessSupervisor(helpers.TestGL):
         self.assertTrue(p_s.shutting_down)
         self.assertFalse(p_s.is_running())
 
+    def test_get_site_messages(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+
+        old_cfgs = [{'hostname': 'root'}, {'hostname': 'a', 'v': 1}, {'hostname': 'b', 'v': 1}]
+        new_cfgs = [{'hostname': 'root'}, {'hostname': 'a', 'v': 2}, {'hostname': 'c', 'v': 1}]
+
+        self.assertEqual(p_s.get_site_messages(old_cfgs, new_cfgs), [
+            {'type': 'remove_site', 'hostname': 'b'},
+            {'type': 'update_site', 'site_cfg': {'hostname': 'a', 'v': 2}},
+            {'type': 'add_site', 'site_cfg': {'hostname': 'c', 'v': 1}}
+        ])
+
+        new_cfgs[0] = {'hostname': 'root', 'v': 1}
+        self.assertEqual(p_s.get_site_messages(new_cfgs, new_cfgs), [])
+        self.assertEqual(p_s.get_site_messages(old_cfgs, new_cfgs)[0],
+                         {'type': 'update_site', 'default': True, 'site_cfg': new_cfgs[0]})
+
+    @inlineCallbacks
+    def test_update_https_workers(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+
+        site_cfgs = yield wrap_db_tx(load_tls_dict_list)
+
+        pp = FakeHTTPSProcProtocol(p_s)
+        p_s.tls_process_pool.append(pp)
+        p_s.tls_cfg['site_cfgs'] = site_cfgs + [dict(site_cfgs[0], hostname=u'removed.example.org')]
+
+        # the running workers are updated without being restarted
+        yield p_s.update_https_workers()
+        self.assertEqual(p_s.tls_process_pool, [pp])
+        self.assertEqual(pp.messages, [{'type': 'remove_site', 'hostname': u'removed.example.org'}])
+        self.assertEqual(p_s.tls_cfg['site_cfgs'], site_cfgs)
+
+        yield toggle_https(enabled=False)
+        yield p_s.update_https_workers()
+        self.assertEqual(pp.signals, [signal.SIGUSR1])
+        self.assertFalse(p_s.is_running())
+
+
+class FakeProcessTransport(object):
+    pid = 0
+
+    def __init__(self, signals):
+        self.signals = signals
+
+    def signalProcess(self, sig):
+        self.signals.append(sig)
+
+
+class FakeHTTPSProcProtocol(HTTPSProcProtocol):
+    def __init__(self, supervisor):
+        HTTPSProcProtocol.__init__(self, supervisor, {'tls_socket_fds': []})
+        self.messages = []
+        self.signals = []
+        self.transport = FakeProcessTransport(self.signals)
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class TestWorkersChannel(helpers.TestGL):
+    def test_read_cfg(self):
+        with tempfile.TemporaryFile() as tmp:
+            tmp.write(b'{"a": 1}\n{"type": "remove_site", "hostname": "a"}\n')
+            tmp.seek(0, 0)
+
+            # the data read after the configuration is returned for the channel
+            self.assertEqual(read_cfg(tmp.fileno(), 4), ({'a': 1}, b'{"t'))
+            self.assertEqual(tmp.read(), b'ype": "remove_site", "hostname": "a"}\n')
+
+    def test_channel(self):
+        received = []
+
+        class FakeSupervisor(object):
+            def handle_worker_message(self, pp, message):
+                received.append(message)
+
+        pp = FakeHTTPSProcProtocol(FakeSupervisor())
+
+        # the messages may be split across multiple reads of the channel
+        data = b'{"type": "ready"}\n{"type": "proxy_pool_stats", "stats": {}}\n'
+        pp.childDataReceived(pp.channel_fd, data[:5])
+        self.assertEqual(received, [])
+
+        pp.childDataReceived(pp.channel_fd, data[5:])
+        self.assertEqual(received, [{'type': 'ready'},
+                                    {'type': 'proxy_pool_stats', 'stats': {}}])
+
+    def test_proxy_pool_stats(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+
+        pp1, pp2 = [FakeHTTPSProcProtocol(p_s) for _ in range(2)]
+
+        for pp in [pp1, pp2]:
+            p_s.handle_worker_message(pp, {'type': 'proxy_pool_stats',
+                                           'stats': {'requests': 10, 'connections': 2, 'idle_connections': 1,
+                                                     'active_connections': 3, 'buffered_bytes': 1024,
+                                                     'static_requests': 5}})
+
+        self.assertEqual(p_s.get_status()['proxy_pool'], {'requests': 20, 'connections': 4, 'idle_connections': 2,
+                                                          'static_requests': 10})
+        self.assertEqual(p_s.get_status()['proxy_buffered_bytes'], [1024, 1024])
+
+        p_s.shutting_down = True
+        p_s.handle_worker_death(pp1, None)
+        self.assertEqual(p_s.get_status()['proxy_pool']['requests'], 10)
+
+    def test_scale_https_workers(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+        p_s.https_workers_min = p_s.https_workers = 1
+        p_s.https_workers_max = 2
+
+        def launch_worker():
+            p_s.tls_process_pool.append(FakeHTTPSProcProtocol(p_s))
+
+        self.patch(p_s, 'launch_worker', launch_worker)
+
+        def report(cpu_time, connections, t):
+            for pp in p_s.tls_process_pool:
+                p_s.handle_worker_message(pp, {'type': 'proxy_pool_stats',
+                                               'stats': {'time': t, 'cpu_time': cpu_time, 'active_connections': connections}})
+
+        launch_worker()
+        report(0, 0, 0)
+        report(9, 10, 10)
+        self.assertEqual(list(p_s.cpu_usage.values()), [0.9])
+
+        # a worker is added when the load is high up to https_workers_max
+        p_s.scale_https_workers()
+        p_s.scale_https_workers()
+        self.assertEqual(len(p_s.tls_process_pool), 2)
+        self.assertEqual(p_s.https_workers, 2)
+
+        report(9, 10, 20)
+        report(9, 10, 30)
+        self.assertEqual(list(p_s.cpu_usage.values()), [0, 0])
+
+        # a worker is drained after scale_down_checks evaluations of low load
+        for _ in range(p_s.scale_down_checks - 1):
+            p_s.scale_https_workers()
+
+        self.assertEqual(len(p_s.tls_process_pool), 2)
+
+        drained = p_s.tls_process_pool[-1]
+        p_s.scale_https_workers()
+        self.assertEqual(p_s.tls_process_pool, p_s.tls_process_pool[:1])
+        self.assertEqual(drained.signals, [signal.SIGUSR2])
+        self.assertEqual(p_s.https_workers, 1)
+
+        # the drained worker is not replaced when it exits
+        p_s.handle_worker_death(drained, None)
+        self.assertEqual(len(p_s.tls_process_pool), 1)
+
+    @inlineCallbacks
+    def test_rolling_reload(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+
+        def launch_worker():
+            p_s.tls_process_pool.append(FakeHTTPSProcProtocol(p_s))
+
+        self.patch(p_s, 'launch_worker', launch_worker)
+
+        for _ in range(3):
+            launch_worker()
+
+        old_workers = list(p_s.tls_process_pool)
+
+        d = p_s.reload()
+
+        for i, old in enumerate(old_workers):
+            # the old worker is drained only when its replacement is ready
+            new = p_s.tls_process_pool[-1]
+            self.assertEqual(len(p_s.tls_process_pool), 4)
+            self.assertEqual(old.signals, [])
+            self.assertEqual(p_s.get_status()['https_workers']['reload'],
+                             {'state': 'running', 'replaced': i, 'total': 3})
+
+            p_s.handle_worker_message(new, {'type': 'ready'})
+            self.assertEqual(old.signals, [signal.SIGUSR2])
+            self.assertFalse(old in p_s.tls_process_pool)
+
+        yield d
+
+        self.assertEqual(len(p_s.tls_process_pool), 3)
+        self.assertEqual(p_s.reload_status, {'state': 'done', 'replaced': 3, 'total': 3})
+
+        # the reload stops if a new worker exits before being ready
+        old_workers = list(p_s.tls_process_pool)
+        d = p_s.reload()
+        new = p_s.tls_process_pool[-1]
+        p_s.shutting_down = True
+        p_s.handle_worker_death(new, None)
+        yield d
+
+        self.assertEqual(p_s.tls_process_pool, old_workers)
+        self.assertEqual(p_s.reload_status['state'], 'failed')
+
 
 @transact
 def wrap_db_tx(session, f, *args, **kwargs):
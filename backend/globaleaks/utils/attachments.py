@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# Resolution of the paths of the files stored in Settings.attachments_path
+#
+# Files are stored in a two level hashed directory layout:
+#
+#   attachments/<h[0:2]>/<h[2:4]>/<filename>   where h = sha256(filename)
+#
+# so that no directory grows with the number of files stored. Files written
+# by previous releases in the flat layout are still resolved and are moved
+# in background by the AttachmentsMigration job.
+import errno
+import filecmp
+import hashlib
+import os
+import time
+
+from six import text_type
+
+from globaleaks.settings import Settings
+
+SHARD_WIDTH = 2
+SHARD_DEPTH = 2
+
+
+def shard_dirs(filename):
+    if isinstance(filename, text_type):
+        filename = filename.encode('utf-8')
+
+    h = hashlib.sha256(filename).hexdigest()
+
+    return [h[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+
+
+def is_shard_dir(name):
+    return len(name) == SHARD_WIDTH and all(c in '0123456789abcdef' for c in name)
+
+
+def sharded_path(filename):
+    filename = os.path.basename(filename)
+
+    return os.path.join(Settings.attachments_path, *(shard_dirs(filename) + [filename]))
+
+
+def flat_path(filename):
+    return os.path.join(Settings.attachments_path, os.path.basename(filename))
+
+
+def get_attachment_path(filename):
+    """
+    Returns the path of an existing attachment; files not yet migrated
+    to the sharded layout are resolved to their flat location.
+    """
+    path = sharded_path(filename)
+    if not os.path.exists(path):
+        legacy_path = flat_path(filename)
+        if os.path.exists(legacy_path):
+            return legacy_path
+
+    return path
+
+
+def get_new_attachment_path(filename):
+    """
+    Returns the path where a new attachment should be written creating
+    the shard directories if needed.
+    """
+    path = sharded_path(filename)
+
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError as excep:
+        if excep.errno != errno.EEXIST:
+            raise
+
+    return path
+
+
+def resolve_attachment_path(path):
+    """
+    Re-resolves a path recorded in the past that could have been moved
+    by the migration to the sharded layout in the meantime.
+    """
+    if os.path.exists(path) or \
+       os.path.dirname(os.path.abspath(path)) != Settings.attachments_path:
+        return path
+
+    return get_attachment_path(os.path.basename(path))
+
+
+def open_attachment(path):
+    """
+    Opens an attachment whose path has been resolved in the past; a file
+    moved by the migration in the meantime is opened at its new location.
+    """
+    try:
+        return open(path, 'rb')
+    except IOError as excep:
+        if excep.errno != errno.ENOENT:
+            raise
+
+    return open(resolve_attachment_path(path), 'rb')
+
+
+def list_flat_attachments():
+    """
+    Returns the names of the files still stored in the flat layout
+    """
+    return [f for f in os.listdir(Settings.attachments_path)
+            if not is_shard_dir(f) and os.path.isfile(os.path.join(Settings.attachments_path, f))]
+
+
+def iter_attachments():
+    """
+    Yields the tuples (filename, path) of all the stored attachments
+    in both the sharded and the flat layout.
+    """
+    def walk(path, depth):
+        for name in os.listdir(path):
+            subpath = os.path.join(path, name)
+            if depth < SHARD_DEPTH and is_shard_dir(name) and os.path.isdir(subpath):
+                for x in walk(subpath, depth + 1):
+                    yield x
+            elif os.path.isfile(subpath):
+                yield name, subpath
+
+    return walk(Settings.attachments_path, 0)
+
+
+def migrate_attachment(filename):
+    """
+    Moves a file from the flat to the sharded layout; returns False if a
+    different file with the same name is already in the sharded layout.
+
+    The move is a rename within the same filesystem and so it is atomic.
+    """
+    src = flat_path(filename)
+    dst = get_new_attachment_path(filename)
+
+    if os.path.exists(dst):
+        if not filecmp.cmp(src, dst, shallow=False):
+            return False
+
+        # the file had already been moved and its flat copy is redundant
+        os.remove(src)
+        return True
+
+    os.rename(src, dst)
+
+    return True
+
+
+def remove_empty_shard_dirs(min_age=3600):
+    """
+    Removes the shard directories left empty by the deletion of the files;
+    the directories modified in the last min_age seconds are kept as they
+    could have been just created for a file not yet written.
+    """
+    threshold = time.time() - min_age
+
+    def walk(path, depth):
+        for name in os.listdir(path):
+            subpath = os.path.join(path, name)
+            if not is_shard_dir(name) or not os.path.isdir(subpath):
+                continue
+
+            if depth + 1 < SHARD_DEPTH:
+                walk(subpath, depth + 1)
+
+            try:
+                if not os.listdir(subpath) and os.path.getmtime(subpath) < threshold:
+                    os.rmdir(subpath)
+            except OSError:
+                # the directory has been populated or removed in the meantime
+                pass
+
+    walk(Settings.attachments_path, 0)
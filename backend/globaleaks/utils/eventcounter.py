@@ -0,0 +1,67 @@
+# -*- coding: utf-8
+#   eventcounter
+#   ************
+#
+# Sliding window counters of events implemented with a ring of time buckets
+import time
+
+
+class EventCounter(object):
+    """
+    Counts events per type using a fixed number of time buckets.
+
+    The counter uses constant memory independently of the number of
+    events: increments are O(1) and window queries are O(buckets).
+    """
+    def __init__(self, bucket_size=60, buckets_count=60):
+        """
+        @param bucket_size: the time span in seconds covered by each bucket
+        @param buckets_count: the number of buckets of the window
+        """
+        self.bucket_size = bucket_size
+        self.buckets_count = buckets_count
+        self.buckets = [{} for _ in range(buckets_count)]
+        self.bucket_ids = [None] * buckets_count
+        self.totals = {}
+
+    def _bucket_id(self, now):
+        return int((time.time() if now is None else now) // self.bucket_size)
+
+    def increment(self, event_type, now=None):
+        bucket_id = self._bucket_id(now)
+        slot = bucket_id % self.buckets_count
+
+        if self.bucket_ids[slot] != bucket_id:
+            self.buckets[slot] = {}
+            self.bucket_ids[slot] = bucket_id
+
+        bucket = self.buckets[slot]
+        bucket[event_type] = bucket.get(event_type, 0) + 1
+        self.totals[event_type] = self.totals.get(event_type, 0) + 1
+
+    def window(self, seconds=None, now=None):
+        """
+        Returns the counts of the events registered in the last seconds;
+        by default the whole span covered by the buckets is considered.
+        """
+        last_bucket_id = self._bucket_id(now)
+
+        buckets_count = self.buckets_count
+        if seconds is not None:
+            buckets_count = min(buckets_count, max(1, -(-seconds // self.bucket_size)))
+
+        first_bucket_id = last_bucket_id - buckets_count + 1
+
+        ret = {}
+        for bucket_id, bucket in zip(self.bucket_ids, self.buckets):
+            if bucket_id is not None and first_bucket_id <= bucket_id <= last_bucket_id:
+                for event_type, count in bucket.items():
+                    ret[event_type] = ret.get(event_type, 0) + count
+
+        return ret
+
+    def get_totals(self):
+        """
+        Returns the counts of all the events registered since the creation of the counter
+        """
+        return dict(self.totals)
@@ -3,173 +3,472 @@ import io
 
 from six.moves import urllib
 from twisted.internet import reactor, protocol, defer
+from twisted.internet.endpoints import UNIXClientEndpoint
 from twisted.internet.protocol import connectionDone
 from twisted.web import http
-from twisted.web.client import Agent
-from twisted.web.iweb import IBodyProducer
+from twisted.web.client import Agent, HTTPConnectionPool
+from twisted.web.iweb import IBodyProducer, UNKNOWN_LENGTH
 from twisted.web.server import NOT_DONE_YET
 from zope.interface import implementer
 
+try:
+    from twisted.web.http import H2_ENABLED, _GenericHTTPChannelProtocol
+except ImportError:
+    # HTTP/2 is supported only by twisted >= 16.3
+    H2_ENABLED = False
+    _GenericHTTPChannelProtocol = http.HTTPChannel
+
+
+def get_buffered_bytes(transport):
+    """
+    Returns the amount of data written on a transport and not yet sent,
+    including the data kept by the TLS layers wrapping the connection
+    """
+    buffered = 0
+
+    while transport is not None:
+        # application data waiting for the TLS handshake
+        buffered += sum(len(x) for x in getattr(transport, '_appSendBuffer', ()))
+
+        # data waiting for the socket to be writable
+        if hasattr(transport, 'dataBuffer'):
+            buffered += len(transport.dataBuffer) - transport.offset + transport._tempDataLen
+
+        transport = getattr(transport, 'transport', None)
+
+    return buffered
+
 
 class BodyStreamer(protocol.Protocol):
-    def __init__(self, streamfunction, finished):
+    """
+    Streams the body of the response of the backend to the client pausing
+    the backend connection while the client is not able to receive data;
+    the backend transport is registered as the producer of the request and
+    so it is paused when the buffer of the client connection is full and
+    resumed once it has been drained
+    """
+    def __init__(self, request, finished):
         self._finished = finished
-        self._streamfunction = streamfunction
+        self._request = request
+
+    def connectionMade(self):
+        if self._request._disconnected:
+            self.transport.stopProducing()
+            return
+
+        self._request.registerProducer(self.transport, True)
+
+        # the download from the backend is aborted if the client disconnects
+        self._request.notifyFinish().addErrback(lambda _: self.transport.stopProducing())
 
     def dataReceived(self, data):
-        self._streamfunction(data)
+        if not self._request._disconnected:
+            self._request.write(data)
 
     def connectionLost(self, reason=connectionDone):
-        self._streamfunction = None
+        # the channel of the request is unset once the client has disconnected
+        if not self._request._disconnected:
+            self._request.unregisterProducer()
+
+        self._request = None
         self._finished.callback(None)
         self._finished = None
 
 
 @implementer(IBodyProducer)
 class BodyProducer(object):
-
-    BUF_MAX_SIZE = 64 * 1024 # TODO Use the hardcoded value for buf max size
-    length = 0
-    bytes_written = 0
-
-    deferred = None
-    inp_buf = None
-    rf_buf_fn = None
-    consumer = None
-
-    def __init__(self, inp_buf, rf_buf_fn, length):
-        self.inp_buf = inp_buf
-        self.rf_buf_fn = rf_buf_fn
-        self.length = length
+    """
+    Forwards the body of a request to the backend as it is received
+    pausing the client connection while the backend connection is not
+    able to send data
+    """
+    BUF_MAX_SIZE = 64 * 1024
+
+    def __init__(self, transport, length):
+        self.transport = transport
+        self.length = length if length is not None else UNKNOWN_LENGTH
+        self.consumer = None
         self.deferred = defer.Deferred()
+        self.buf = []
+        self.buf_size = 0
+        self.paused = False
+        self.finished = False
+        self.stopped = False
 
     def startProducing(self, consumer):
         self.consumer = consumer
-        return self.resumeProducing()
 
-    def resumeProducing(self):
-        chunk = self.inp_buf.read()
-        n = len(chunk)
-        if n != 0:
-            self.consumer.write(chunk)
-            self.bytes_written += n
-            if self.bytes_written > self.BUF_MAX_SIZE:
-                self.inp_buf = self.rf_buf_fn()
-                self.bytes_written = 0
-        else:
+        for chunk in self.buf:
+            consumer.write(chunk)
+
+        self.buf = []
+        self.buf_size = 0
+
+        if self.finished:
             self.deferred.callback(None)
+        else:
+            self.resumeProducing()
 
         return self.deferred
 
-    def stopProducing(self):
-        self.deferred = None
-        self.inp_buf.close()
-        self.rf_buf_fn = None
-        self.consumer = None
+    def write(self, data):
+        if self.stopped:
+            return
+
+        if self.consumer is not None:
+            self.consumer.write(data)
+            return
+
+        # data received before the connection to the backend is ready
+        self.buf.append(data)
+        self.buf_size += len(data)
+        if self.buf_size > self.BUF_MAX_SIZE:
+            self.pauseProducing()
+
+    def finish(self):
+        self.finished = True
+
+        if self.consumer is not None and not self.stopped:
+            self.deferred.callback(None)
+
+    def resumeProducing(self):
+        if self.paused:
+            self.paused = False
+            self.transport.resumeProducing()
 
     def pauseProducing(self):
-        pass
+        if not self.paused:
+            self.paused = True
+            self.transport.pauseProducing()
+
+    def stopProducing(self):
+        self.stopped = True
+        self.consumer = None
+        self.resumeProducing()
 
 
 class HTTPStreamProxyRequest(http.Request):
-    def __init__(self, *args, **kwargs):
-        http.Request.__init__(self, *args, **kwargs)
-
-    def reset_buffer(self):
-        self.content.seek(0, 0)
-        self.content.truncate(0)
-        return self.content
+    """
+    Request forwarded to the backend as soon as its headers are received
+    """
+    prod = None
+    proxy_d = None
+    content_received = False
+    stream_length = None
 
     def gotLength(self, length):
-        http.Request.gotLength(self, length)
-        if hasattr(self.content, 'close'):
-            self.content.close()
-            self.content = io.BytesIO()
-            self.reset_buffer()
+        if isinstance(self.channel, http.HTTPChannel):
+            self.start(length)
+        else:
+            # the streams of the HTTP/2 connections call gotLength as soon as
+            # the Content-Length header is converted and so the request is
+            # started only once all the headers have been converted
+            self.stream_length = length
+
+    def parseCookies(self):
+        http.Request.parseCookies(self)
+
+        # the streams of the HTTP/2 connections parse the cookies right
+        # after converting the headers, unlike HTTPChannel that parses
+        # them before calling gotLength
+        if not isinstance(self.channel, http.HTTPChannel):
+            self.start(self.stream_length)
+
+    def start(self, length):
+        self.content = io.BytesIO()
+
+        # the command and the path of the request are set on the request by
+        # twisted only after the body has been received
+        if isinstance(self.channel, http.HTTPChannel):
+            self.method = self.channel._command
+            self.uri = self.channel._path
+            self.clientproto = self.channel._version
+        else:
+            # the channel is a stream of a HTTP/2 connection
+            self.method = self.channel.command
+            self.uri = self.channel.path
+            self.clientproto = b'HTTP/2'
 
-    def process(self):
+        self.client = self.channel.getPeer()
+        self.host = self.channel.getHost()
+
+        self.response_ready = defer.Deferred()
+
+        # the cached files are served only for the hostnames for which
+        # the backend has already returned a successful response
+        factory = self.channel.factory
+        tenant_headers = factory.tenant_headers.get(self.getRequestHostname())
+
+        entry = None
+        if self.method in (b'GET', b'HEAD') and factory.static_cache is not None and tenant_headers is not None:
+            entry = factory.static_cache.get(urllib.parse.urlsplit(self.uri)[2])
+
+        if entry is not None:
+            self.response_ready.addCallback(lambda _: self.writeStatic(entry, tenant_headers))
+        else:
+            self.proxy(length)
+
+    def handleContentChunk(self, data):
+        if self.prod is not None:
+            self.prod.write(data)
+
+    def proxy(self, length):
         # process self.uri removing: scheme, netloc and fragment
         split = urllib.parse.urlsplit(self.uri.decode('utf-8'))
-        self.uri = urllib.parse.urlunsplit(('', '', split[2], split[3], ''))
+        uri = urllib.parse.urlunsplit(('', '', split[2], split[3], ''))
 
-        joined_url = urllib.parse.urljoin(self.channel.proxy_url.encode('utf-8'), self.uri.encode('utf-8'))
+        joined_url = urllib.parse.urljoin(self.channel.factory.proxy_url.encode('utf-8'), uri.encode('utf-8'))
 
-        hdrs = self.requestHeaders
+        hdrs = self.requestHeaders.copy()
         hdrs.setRawHeaders(b'GL-Forwarded-For', [self.getClientIP()])
 
-        prod = None
-        content_length = self.getHeader(b'Content-Length')
-        if content_length is not None:
+        # the length of the body of the HTTP/2 requests is not known
+        # in advance if they do not carry a Content-Length header
+        if length is None or hdrs.hasHeader(b'Content-Length') or hdrs.hasHeader(b'Transfer-Encoding'):
             hdrs.removeHeader(b'Content-Length')
-            prod = BodyProducer(self.content, self.reset_buffer, int(content_length))
-            self.registerProducer(prod, streaming=True)
+            hdrs.removeHeader(b'Transfer-Encoding')
+
+            # the HTTP/2 streams are paused individually through their flow
+            # control window without pausing the other streams of the connection
+            self.prod = BodyProducer(self.transport if self.clientproto != b'HTTP/2' else self.channel, length)
+
+        self.proxy_d = self.channel.factory.http_agent.request(method=self.method,
+                                                               uri=joined_url,
+                                                               headers=hdrs,
+                                                               bodyProducer=self.prod)
+
+        self.proxy_d.addCallbacks(self.proxySuccess, self.proxyError)
+
+    def requestReceived(self, command, path, version):
+        # the arguments of the request are not parsed since the body has
+        # already been forwarded to the backend
+        self.process()
+
+    def connectionLost(self, reason):
+        http.Request.connectionLost(self, reason)
+
+        if not self.content_received and self.proxy_d is not None:
+            # the client disconnected before sending the whole request
+            self.proxy_d.cancel()
+
+    def process(self):
+        self.content_received = True
 
-        proxy_d = self.channel.http_agent.request(method=self.method,
-                                                  uri=joined_url,
-                                                  headers=hdrs,
-                                                  bodyProducer=prod)
-        if prod is not None:
-            proxy_d.addBoth(self.proxyUnregister)
+        if self.prod is not None:
+            self.prod.finish()
 
-        proxy_d.addCallbacks(self.proxySuccess, self.proxyError)
+        # the response is written only once the whole request has been received
+        self.response_ready.callback(None)
 
         return NOT_DONE_YET
 
     def proxySuccess(self, response):
-        self.responseHeaders = response.headers
+        def forward(_):
+            self.responseHeaders = response.headers
+
+            self.responseHeaders.setRawHeaders(b'Strict-Transport-Security', [b'max-age=31536000'])
+
+            self.setResponseCode(response.code)
 
-        self.responseHeaders.setRawHeaders(b'Strict-Transport-Security', [b'max-age=31536000'])
+            if response.code < 400 and not self._disconnected:
+                self.channel.factory.set_tenant_headers(self.getRequestHostname(), response.headers)
 
-        self.setResponseCode(response.code)
+            d_forward = defer.Deferred()
 
-        d_forward = defer.Deferred()
+            response.deliverBody(BodyStreamer(self, d_forward))
 
-        response.deliverBody(BodyStreamer(self.write, d_forward))
+            d_forward.addBoth(self.forwardClose)
 
-        d_forward.addBoth(self.forwardClose)
+        self.response_ready.addCallback(forward)
 
     def proxyError(self, fail):
-        # Always apply the HSTS header. Compliant browsers using plain HTTP will ignore it.
-        self.responseHeaders.setRawHeaders(b'Strict-Transport-Security', [b'max-age=31536000'])
-        self.setResponseCode(502)
+        def forward(_):
+            # Always apply the HSTS header. Compliant browsers using plain HTTP will ignore it.
+            self.responseHeaders.setRawHeaders(b'Strict-Transport-Security', [b'max-age=31536000'])
+            self.setResponseCode(502)
+            self.forwardClose()
+
+        if self.prod is not None:
+            # the body received from now on is discarded
+            self.prod.stopProducing()
+
+        self.response_ready.addCallback(forward)
+
+    def writeStatic(self, entry, tenant_headers):
+        """
+        Writes a file of the client from the cache with the headers
+        that the backend sets on the static files, including the ones
+        depending on the configuration of the tenant.
+
+        Content-Language and x-check-tor are not sent as they depend on
+        the client and not on the files, that are the same for all the
+        languages.
+        """
+        self.setHeader(b'Server', b'Globaleaks')
+        self.setHeader(b'X-Content-Type-Options', b'nosniff')
+        self.setHeader(b'X-XSS-Protection', b'1; mode=block')
+        self.setHeader(b'Cache-control', b'no-cache, no-store, must-revalidate')
+        self.setHeader(b'Pragma', b'no-cache')
+        self.setHeader(b'Expires', b'-1')
+        self.setHeader(b'Referrer-Policy', b'no-referrer')
+        self.setHeader(b'Strict-Transport-Security', b'max-age=31536000')
+        self.setHeader(b'Content-Type', entry['content_type'])
+
+        for name, values in tenant_headers:
+            self.responseHeaders.setRawHeaders(name, values)
+
+        data = entry['identity']
+        if entry['gzip'] is not None:
+            self.setHeader(b'Vary', b'Accept-Encoding')
+            if b'gzip' in (self.getHeader(b'Accept-Encoding') or b''):
+                self.setHeader(b'Content-Encoding', b'gzip')
+                data = entry['gzip']
+
+        self.setHeader(b'Content-Length', b'%d' % len(data))
+        self.write(data)
         self.forwardClose()
 
-    def proxyUnregister(self, o):
-        self.unregisterProducer()
-        return o
-
     def forwardClose(self, *args):
         self.content.close()
-        self.finish()
+
+        if not self._disconnected:
+            self.finish()
+
+
+class UNIXEndpointFactory(object):
+    """
+    Factory of the endpoints connecting to the backend through a UNIX socket
+    independently of the host and the port of the requested URL
+    """
+    def __init__(self, reactor, path, timeout=30):
+        self.reactor = reactor
+        self.path = path
+        self.timeout = timeout
+
+    def endpointForURI(self, uri):
+        return UNIXClientEndpoint(self.reactor, self.path, self.timeout)
+
+
+class ProxyConnectionPool(HTTPConnectionPool):
+    """
+    Pool of the connections to the backend keeping track of their usage
+    """
+    def __init__(self, reactor, persistent=True, max_connections=16, idle_timeout=60):
+        HTTPConnectionPool.__init__(self, reactor, persistent)
+        self.maxPersistentPerHost = max_connections
+        self.cachedConnectionTimeout = idle_timeout
+
+        self.requests = 0
+        self.connections = 0
+
+    def getConnection(self, key, endpoint):
+        self.requests += 1
+        return HTTPConnectionPool.getConnection(self, key, endpoint)
+
+    def _newConnection(self, key, endpoint):
+        self.connections += 1
+        return HTTPConnectionPool._newConnection(self, key, endpoint)
+
+    def get_stats(self):
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'idle_connections': sum(len(x) for x in self._connections.values())
+        }
 
 
 class HTTPStreamChannel(http.HTTPChannel):
     requestFactory = HTTPStreamProxyRequest
 
-    def __init__(self, proxy_url, *args, **kwargs):
-        http.HTTPChannel.__init__(self, *args, **kwargs)
 
-        self.proxy_url = proxy_url
-        self.http_agent = Agent(reactor, connectTimeout=30)
+class HTTPStreamProtocol(_GenericHTTPChannelProtocol):
+    """
+    Protocol serving the connection with HTTP/2 when it is the protocol
+    negotiated with ALPN and with HTTP/1.1 otherwise; each HTTP/2 stream
+    is forwarded to the backend as a separate request
+    """
+    @property
+    def transport(self):
+        return self._channel.transport
 
 
 class HTTPStreamFactory(http.HTTPFactory):
-    def __init__(self, proxy_url, *args, **kwargs):
+    # Headers set by the backend according to the configuration of the tenants
+    tenant_headers_names = (b'X-Robots-Tag', b'X-Frame-Options')
+
+    # Maximum number of hostnames whose tenant headers are kept
+    tenant_headers_limit = 1024
+
+    def __init__(self, proxy_url, pool_persistent=True, pool_max_connections=16, pool_idle_timeout=60, proxy_socket=None, static_cache=None, http2=False, *args, **kwargs):
         http.HTTPFactory.__init__(self, *args, **kwargs)
         self.proxy_url = proxy_url
+
+        # HTTP/2 is used only on the connections that negotiate it
+        # and so it is advertised only if the h2 library is available
+        self.http2 = http2 and H2_ENABLED
+
+        # The files of the client found in the cache are served without
+        # forwarding the requests to the backend
+        self.static_cache = static_cache
+
+        # The tenant headers of the last successful response of the
+        # backend for each hostname
+        self.tenant_headers = {}
+
         self.active_connections = 0
+        self.channels = set()
+
+        # The connections to the backend are shared by all the clients
+        # and kept alive across requests
+        self.pool = ProxyConnectionPool(reactor, pool_persistent, pool_max_connections, pool_idle_timeout)
+        if proxy_socket is not None:
+            # the requests are sent to the UNIX socket of the backend;
+            # proxy_url still provides the scheme and the host of their URL
+            self.http_agent = Agent.usingEndpointFactory(reactor, UNIXEndpointFactory(reactor, proxy_socket), pool=self.pool)
+        else:
+            self.http_agent = Agent(reactor, connectTimeout=30, pool=self.pool)
+
+    def set_tenant_headers(self, hostname, headers):
+        if hostname not in self.tenant_headers and len(self.tenant_headers) >= self.tenant_headers_limit:
+            return
+
+        self.tenant_headers[hostname] = [(name, headers.getRawHeaders(name))
+                                         for name in self.tenant_headers_names if headers.hasHeader(name)]
+
+    def stopFactory(self):
+        self.pool.closeCachedConnections()
+        http.HTTPFactory.stopFactory(self)
+
+    def log(self, request):
+        # the requests are logged by the backend
+        pass
+
+    def get_stats(self):
+        stats = self.pool.get_stats()
+        stats['active_connections'] = self.active_connections
+        stats['static_requests'] = self.static_cache.hits if self.static_cache is not None else 0
+        stats['buffered_bytes'] = sum(get_buffered_bytes(c.transport) for c in self.channels)
+        return stats
 
     def buildProtocol(self, addr):
-        proto = HTTPStreamChannel(self.proxy_url)
+        proto = HTTPStreamChannel()
+        if self.http2:
+            proto = HTTPStreamProtocol(proto)
+            proto.requestFactory = HTTPStreamProxyRequest
+
+        proto.factory = self
+
         _connectionMade = proto.connectionMade
         _connectionLost = proto.connectionLost
 
         def connectionMade(*args):
             self.active_connections += 1
+            self.channels.add(proto)
             return _connectionMade(*args)
 
         def connectionLost(*args):
             self.active_connections -= 1
+            self.channels.discard(proto)
             return _connectionLost(*args)
 
         proto.connectionMade = connectionMade
@@ -5,7 +5,7 @@ import os
 import random
 import scrypt
 import string
-import sys
+import time
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import constant_time, hashes
@@ -78,49 +78,70 @@ def generate_api_token():
     return token, sha512(token.encode())
 
 
-def _overwrite(absolutefpath, pattern):
-    count = 0
-    length = len(pattern)
+OVERWRITE_BLOCK_SIZE = 1024 * 1024
+OVERWRITE_ZEROS = b'\x00' * OVERWRITE_BLOCK_SIZE
+OVERWRITE_ONES = b'\xff' * OVERWRITE_BLOCK_SIZE
 
-    with open(absolutefpath, 'w+') as f:
-        f.seek(0)
-        while count < length:
-            f.write(pattern)
-            count += len(pattern)
 
+def _overwrite(absolutefpath, pattern, size, rate_limit=0):
+    """
+    Overwrites in place the first size bytes of the file repeating the
+    pattern and flushes the result to the disk.
+
+    :param rate_limit: the maximum rate in bytes per second (0 means unlimited)
+    """
+    written = 0
+    start = time.time()
+
+    with open(absolutefpath, 'r+b') as f:
+        while written < size:
+            block = pattern[:size - written]
+            f.write(block)
+            written += len(block)
 
-def overwrite_and_remove(absolutefpath, iterations_number=1):
+            if rate_limit:
+                delay = written / float(rate_limit) - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def overwrite(absolutefpath, iterations_number=1, rate_limit=0):
     """
     Overwrite the file with all_zeros, all_ones, random patterns
 
-    Note: At each iteration the original size of the file is altered.
+    The patterns are written in large blocks taken from precomputed
+    buffers; the optional rate limit (bytes per second) applies to
+    each single overwrite pass.
     """
-    log.debug("Starting secure deletion of file %s", absolutefpath)
+    size = os.path.getsize(absolutefpath)
 
-    randomgen = random.SystemRandom()
+    # The file is open and closed at each pass on purpose, to trigger flush operations
+    for iteration in range(iterations_number):
+        random_pattern = os.urandom(OVERWRITE_BLOCK_SIZE)
 
-    try:
-        # in the following loop, the file is open and closed on purpose, to trigger flush operations
-        all_zeros = "\0\0\0\0" * 1024               # 4kb of zeros
+        log.debug("Excecuting rewrite iteration (%d out of %d)",
+                  iteration, iterations_number)
+
+        for pattern in [OVERWRITE_ZEROS, OVERWRITE_ONES, random_pattern]:
+            _overwrite(absolutefpath, pattern, size, rate_limit)
 
-        if sys.version_info[0] == 2:
-            all_ones = "FFFFFFFF".decode("hex") * 1024  # 4kb of ones
-        else:
-            all_ones = "\xFF" * 4096
 
-        for iteration in range(iterations_number):
-            OPTIMIZATION_RANDOM_BLOCK = randomgen.randint(4096, 4096 * 2)
+def overwrite_and_remove(absolutefpath, iterations_number=1, rate_limit=0):
+    """
+    Overwrite the file with all_zeros, all_ones, random patterns and
+    remove it; the file is removed even if the overwrite fails.
 
-            random_pattern = ""
-            for _ in range(OPTIMIZATION_RANDOM_BLOCK):
-                random_pattern += str(randomgen.randrange(256))
+    Returns the time in seconds spent for the deletion.
+    """
+    log.debug("Starting secure deletion of file %s", absolutefpath)
 
-            log.debug("Excecuting rewrite iteration (%d out of %d)",
-                      iteration, iterations_number)
+    start = time.time()
 
-            _overwrite(absolutefpath, all_zeros)
-            _overwrite(absolutefpath, all_ones)
-            _overwrite(absolutefpath, random_pattern)
+    try:
+        overwrite(absolutefpath, iterations_number, rate_limit)
 
     except Exception as excep:
         log.err("Unable to perform secure overwrite for file %s: %s",
@@ -133,7 +154,11 @@ def overwrite_and_remove(absolutefpath, iterations_number=1):
             log.err("Unable to perform unlink operation on file %s: %s",
                     absolutefpath, excep)
 
-    log.debug("Performed deletion of file: %s", absolutefpath)
+    elapsed = time.time() - start
+
+    log.debug("Performed deletion of file: %s (%.3fs)", absolutefpath, elapsed)
+
+    return elapsed
 
 
 def directory_traversal_check(trusted_absolute_prefix, untrusted_path):
@@ -7,6 +7,7 @@
 # is currently not released as Debian package.
 
 import collections
+import time
 
 from OpenSSL.SSL import Connection
 from twisted.internet.interfaces import IOpenSSLServerConnectionCreator
@@ -114,23 +115,124 @@ class _ConnectionProxy(object):
 
 @implementer(IOpenSSLServerConnectionCreator)
 class SNIMap(object):
-    def __init__(self, mapping):
+    """
+    Selects the TLS context of a connection by the hostname requested by
+    the client through SNI falling back to the DEFAULT context.
+
+    When a build function is specified the mapping contains the
+    configurations of the sites and the context of each site is built by
+    the function on the first handshake for its hostname; the contexts
+    built are kept in a LRU cache of size_limit entries.
+
+    When protocols are specified they are offered through ALPN in order
+    of preference on the contexts of all the sites.
+    """
+    def __init__(self, mapping, build=None, size_limit=None, protocols=None):
         self.mapping = mapping
+        self.build = build
+        self.size_limit = size_limit
+        self.protocols = protocols
+        self.contexts = collections.OrderedDict()
+
+        # time in seconds spent for building the context of each hostname
+        self.build_times = {}
+
         self._negotiationDataForContext = collections.defaultdict(
             _NegotiationData
         )
 
-        self.context = self.mapping['DEFAULT'].getContext()
+        default = self.mapping['DEFAULT']
+        if self.build is not None:
+            default = self.build(default)
+
+        self.context = default.getContext()
 
         self.context.set_tlsext_servername_callback(
             self.selectContext
         )
 
+        self.setProtocols(self.context)
+
+    def setProtocols(self, context):
+        """
+        Sets the ALPN callbacks on a DEFAULT context; they are recorded in
+        order to be set also on the context selected by SNI
+        """
+        if self.protocols is None:
+            return
+
+        context = _ContextProxy(context, self)
+        context.set_alpn_select_callback(self.selectProtocol)
+        context.set_alpn_protos(self.protocols)
+
+    def selectProtocol(self, connection, protocols):
+        for protocol in self.protocols:
+            if protocol in protocols:
+                return protocol
+
+        # no protocol is negotiated and the client falls back to HTTP/1.1
+        return b''
+
+    def getContextFactory(self, hostname):
+        if self.build is None:
+            return self.mapping[hostname]
+
+        factory = self.contexts.pop(hostname, None)
+        if factory is None:
+            start = time.time()
+
+            try:
+                factory = self.build(self.mapping[hostname])
+            except Exception:
+                # the site is not retried and is served with the DEFAULT context
+                del self.mapping[hostname]
+                raise
+
+            self.build_times[hostname] = time.time() - start
+
+            if self.size_limit is not None:
+                while len(self.contexts) >= self.size_limit:
+                    self.contexts.popitem(last=False)
+
+        # the context is moved to the end as the most recently used
+        self.contexts[hostname] = factory
+
+        return factory
+
+    def setDefault(self, value):
+        """
+        Replaces the DEFAULT context used by the new connections
+        """
+        context = (self.build(value) if self.build is not None else value).getContext()
+        context.set_tlsext_servername_callback(self.selectContext)
+        self.setProtocols(context)
+
+        self.mapping['DEFAULT'] = value
+        self.context = context
+
+    def setSite(self, hostname, value):
+        """
+        Adds or replaces a site; the connections already established
+        keep using the context with which they have been started
+        """
+        self.mapping[hostname] = value
+        self.contexts.pop(hostname, None)
+
+    def removeSite(self, hostname):
+        self.mapping.pop(hostname, None)
+        self.contexts.pop(hostname, None)
+
     def selectContext(self, connection):
         common_name = connection.get_servername()
 
-        if common_name in self.mapping:
-            newContext = self.mapping[common_name].getContext()
+        if common_name in self.mapping and common_name != 'DEFAULT':
+            try:
+                factory = self.getContextFactory(common_name)
+            except Exception:
+                # the connection continues with the DEFAULT context
+                return
+
+            newContext = factory.getContext()
 
             negotiationData = self._negotiationDataForContext[connection.get_context()]
             negotiationData.negotiateNPN(newContext)
@@ -1,12 +1,37 @@
+import os
 import socket
 
+from twisted.internet import tcp, unix
 from twisted.protocols import tls
 
 
+class SharedUNIXPort(unix.Port):
+    """
+    Port listening on a UNIX socket shared by multiple processes.
+
+    The file of the socket is not removed when the port is closed because
+    the socket is still in use by the other processes; the file is removed
+    by the process that created it.
+
+    The socket is kept accessible only by its owner.
+    """
+    def __init__(self, fileName, factory, backlog=50, mode=0o600, reactor=None, wantPID=0):
+        unix.Port.__init__(self, fileName, factory, backlog, mode, reactor, wantPID)
+
+    def connectionLost(self, reason):
+        tcp.Port.connectionLost(self, reason)
+
+
 def listen_tcp_on_sock(reactor, fd, factory):
     return reactor.adoptStreamPort(fd, socket.AF_INET, factory)
 
 
+def listen_unix_on_sock(reactor, fd, factory):
+    port = SharedUNIXPort._fromListeningDescriptor(reactor, fd, factory)
+    port.startListening()
+    return port
+
+
 def listen_tls_on_sock(reactor, fd, contextFactory, factory):
     tlsFactory = tls.TLSMemoryBIOFactory(contextFactory, False, factory)
     port = listen_tcp_on_sock(reactor, fd, tlsFactory)
@@ -23,9 +48,37 @@ def open_socket_listen(ip, port):
     return s
 
 
+def open_unix_socket_listen(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.setblocking(False)
+
+    # the file of the socket is made accessible only by its owner
+    umask = os.umask(0o177)
+    try:
+        s.bind(path)
+    finally:
+        os.umask(umask)
+
+    os.chmod(path, 0o600)
+
+    s.listen(1024)
+    return s
+
+
 def reserve_port_for_ip(ip, port):
     try:
         sock = open_socket_listen(ip, port)
         return [sock, None]
     except Exception as err:
         return [None, err]
+
+
+def reserve_unix_socket(path):
+    try:
+        sock = open_unix_socket_listen(path)
+        return [sock, None]
+    except Exception as err:
+        return [None, err]
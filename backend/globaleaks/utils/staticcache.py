@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# staticcache
+#   ***********
+#
+#   Implements the cache of the static files of the client served directly
+#   by the HTTPS workers without forwarding the requests to the backend.
+import gzip
+import io
+import mimetypes
+import os
+
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+        f.write(data)
+
+    return buf.getvalue()
+
+
+def gzip_decompress(data):
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as f:
+        return f.read()
+
+
+class StaticFileCache(object):
+    """
+    Cache of the static files of the client keeping in memory their content
+    and their gzip compressed variant.
+
+    Only the files of the specified directories are cached; the other paths,
+    including index.html that is subject to the redirects of the backend and
+    the translations served by the backend under /l10n, are always forwarded
+    to the backend. The files of the client are not
+    changed while the software is running and so the cache is loaded once
+    and never invalidated.
+    """
+    directories = ('css', 'data', 'fonts', 'img', 'js')
+
+    def __init__(self, path, size_limit=32 * 1024 * 1024):
+        self.root = os.path.abspath(path)
+        self.size_limit = size_limit
+        self.size = 0
+        self.entries = {}
+        self.hits = 0
+
+        for directory in self.directories:
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, directory)):
+                for filename in sorted(filenames):
+                    if not filename.endswith('.gz') or filename[:-3] not in filenames:
+                        self.load(os.path.join(dirpath, filename))
+
+    def load(self, abspath):
+        with open(abspath, 'rb') as f:
+            data = f.read()
+
+        filepath = abspath
+        if abspath.endswith('.gz'):
+            filepath = abspath[:-3]
+            identity, compressed = gzip_decompress(data), data
+        elif os.path.isfile(abspath + '.gz'):
+            with open(abspath + '.gz', 'rb') as f:
+                identity, compressed = data, f.read()
+        else:
+            identity, compressed = data, gzip_compress(data)
+
+        content_type, _ = mimetypes.guess_type(filepath)
+
+        # the documents are left to the backend that sets the headers of the tenants
+        if content_type == 'text/html':
+            return
+
+        if len(compressed) >= len(identity):
+            compressed = None
+
+        size = len(identity) + len(compressed or b'')
+        if self.size + size > self.size_limit:
+            return
+
+        self.size += size
+
+        path = '/' + os.path.relpath(filepath, self.root).replace(os.sep, '/')
+
+        self.entries[path.encode('utf-8')] = {
+            'content_type': (content_type or 'application/octet-stream').encode('utf-8'),
+            'identity': identity,
+            'gzip': compressed
+        }
+
+    def get(self, path):
+        entry = self.entries.get(path)
+        if entry is not None:
+            self.hits += 1
+
+        return entry
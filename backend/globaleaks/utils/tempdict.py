@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import heapq
+import math
 import six
 from collections import OrderedDict
 
@@ -8,14 +10,66 @@ from twisted.internet import reactor as _reactor
 # needed in order to allow UT override
 reactor = _reactor
 
+
+class ExpireCall(object):
+    """
+    Expiration timer of a TempDict entry.
+
+    The object implements the subset of the interface of the DelayedCall
+    used on the TempDict items without scheduling anything on the reactor;
+    the expiration is lazily evaluated by the periodic tick of the TempDict.
+    """
+    __slots__ = ['key', 'time', 'cancelled']
+
+    def __init__(self, key, seconds_later):
+        self.key = key
+        self.time = reactor.seconds() + seconds_later
+        self.cancelled = False
+
+    def getTime(self):
+        return self.time
+
+    def reset(self, seconds_later):
+        self.time = reactor.seconds() + seconds_later
+
+    def cancel(self):
+        self.cancelled = True
+
+    def active(self):
+        return not self.cancelled
+
+
 class TempDict(OrderedDict):
+    """
+    Dictionary whose entries expire after a timeout from their last access.
+
+    The expiration timers are kept in buckets of one second indexed by
+    expiration time and served by a single periodic tick per dictionary
+    so that touching an entry costs O(1) and the reactor does not keep
+    a DelayedCall for each entry.
+    """
     expireCallback = None
 
+    # resolution of the timers in seconds
+    tick_interval = 1
+
+    # secondary indexes maintained on the items of the dictionary defined
+    # as a map of the name of the index to the function returning the
+    # indexed value of an item
+    indexes = {}
+
     def __init__(self, timeout=None, size_limit=None):
         self.timeout = timeout
         self.size_limit = size_limit
         OrderedDict.__init__(self)
 
+        self._buckets = {}
+        self._buckets_heap = []
+        self._tick_call = None
+        self._tick_reactor = None
+
+        self._indexes = {name: {} for name in self.indexes}
+
         self._check_size_limit()
 
     def get_timeout(self):
@@ -26,15 +80,42 @@ class TempDict(OrderedDict):
         """The override of this method allows dynamic limits imlementations"""
         return self.size_limit
 
+    def __setitem__(self, key, item):
+        if key in self:
+            self._unindex(key, self[key])
+
+        OrderedDict.__setitem__(self, key, item)
+
+        self._index(key, item)
+
+    def __delitem__(self, key):
+        self._unindex(key, self[key])
+
+        OrderedDict.__delitem__(self, key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._unindex(key, self[key])
+
+        return OrderedDict.pop(self, key, *args)
+
+    def lookup(self, index, value):
+        """
+        Returns the list of the keys of the items whose indexed value is equal to value
+        """
+        return list(self._indexes[index].get(value, ()))
+
     def set(self, key, item):
         self._check_size_limit()
-        timeout = self.get_timeout()
-        item.expireCall = reactor.callLater(timeout, self._expire, key)
+        item.expireCall = ExpireCall(key, self.get_timeout())
+        self._add_timer(item.expireCall)
         self[key] = item
 
     def get(self, key):
         if key in self:
             if self[key].expireCall is not None:
+                # the timer is moved to its new bucket only when its
+                # current bucket is served by the tick
                 self[key].expireCall.reset(self.get_timeout())
 
             return self[key]
@@ -49,6 +130,19 @@ class TempDict(OrderedDict):
         else:
             raise Exception("Failed to delete %s from %s" % (key, self.__class__))
 
+    def clear(self):
+        OrderedDict.clear(self)
+
+        for index in self._indexes.values():
+            index.clear()
+
+        self._buckets.clear()
+        del self._buckets_heap[:]
+
+        if self._tick_call is not None and self._tick_call.active():
+            self._tick_call.cancel()
+
+        self._tick_call = None
 
     def _check_size_limit(self):
         size_limit = self.get_size_limit()
@@ -58,6 +152,64 @@ class TempDict(OrderedDict):
                 k = next(six.iterkeys(self))
                 self.delete(k)
 
+    def _index(self, key, item):
+        for name, f in self.indexes.items():
+            self._indexes[name].setdefault(f(item), set()).add(key)
+
+    def _unindex(self, key, item):
+        for name, f in self.indexes.items():
+            value = f(item)
+            entries = self._indexes[name].get(value)
+            if entries is not None:
+                entries.discard(key)
+                if not entries:
+                    del self._indexes[name][value]
+
+    def _add_timer(self, call):
+        bucket_time = int(math.ceil(call.time / self.tick_interval)) * self.tick_interval
+
+        bucket = self._buckets.get(bucket_time)
+        if bucket is None:
+            bucket = self._buckets[bucket_time] = []
+            heapq.heappush(self._buckets_heap, bucket_time)
+
+        bucket.append(call)
+
+        self._schedule_tick()
+
+    def _schedule_tick(self):
+        if self._tick_call is not None and self._tick_call.active() and self._tick_reactor is reactor:
+            return
+
+        self._tick_reactor = reactor
+        self._tick_call = reactor.callLater(self.tick_interval, self._tick)
+
+    def _tick(self):
+        self._tick_call = None
+
+        now = reactor.seconds()
+
+        expired = []
+        while self._buckets_heap and self._buckets_heap[0] <= now:
+            for call in self._buckets.pop(heapq.heappop(self._buckets_heap)):
+                if call.cancelled or call.key not in self or getattr(self[call.key], 'expireCall', None) is not call:
+                    # stale timer of an entry removed or replaced
+                    continue
+
+                if call.time <= now:
+                    expired.append(call)
+                else:
+                    self._add_timer(call)
+
+        # the sort is stable and so entries with the same expiration
+        # time expire in the order of their last access
+        expired.sort(key=lambda call: call.time)
+        for call in expired:
+            self._expire(call.key)
+
+        if self._buckets:
+            self._schedule_tick()
+
     def _expire(self, key):
         if key in self:
             if self.expireCallback is not None:
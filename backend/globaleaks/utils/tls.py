@@ -155,16 +155,34 @@ class TLSClientContextFactory(ssl.ClientContextFactory):
         return new_tls_client_context()
 
 
+def get_session_cache_stats(ctx):
+    """
+    Returns the statistics of the cache of the sessions of a server context
+    """
+    return {
+        'accepts': _lib.SSL_CTX_sess_accept(ctx._context), # pylint: disable=no-member
+        'hits': _lib.SSL_CTX_sess_hits(ctx._context), # pylint: disable=no-member
+        'misses': _lib.SSL_CTX_sess_misses(ctx._context), # pylint: disable=no-member
+        'sessions': _lib.SSL_CTX_sess_number(ctx._context) # pylint: disable=no-member
+    }
+
+
 class TLSServerContextFactory(ssl.ContextFactory):
-    def __init__(self, priv_key, certificate, intermediate, dh):
+    def __init__(self, priv_key, certificate, intermediate, dh, session_timeout=300):
         """
         @param priv_key: String representation of the private key
         @param certificate: String representation of the certificate
         @param intermediate: String representation of the intermediate file
         @param dh: String representation of the DH parameters
+        @param session_timeout: Seconds for which the sessions can be resumed
         """
         self.ctx = new_tls_server_context()
 
+        # The sessions are resumed only by the process that created them
+        # since the contexts are not shared among the https workers
+        self.ctx.set_session_cache_mode(SSL.SESS_CACHE_SERVER)
+        self.ctx.set_timeout(session_timeout)
+
         x509 = load_certificate(FILETYPE_PEM, certificate)
         self.ctx.use_certificate(x509)
 
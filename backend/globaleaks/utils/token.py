@@ -17,7 +17,15 @@ from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
 from globaleaks.utils.log import log
 
 
+# format of the creation date of the tokens kept in the store
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
 class TokenListClass(TempDict):
+    # Store used to share the tokens with the other backend processes;
+    # when it is set it is authoritative and this dictionary acts as a cache
+    store = None
+
     def __init__(self, *args, **kwds):
         TempDict.__init__(self, *args, **kwds)
 
@@ -34,13 +42,67 @@ class TokenListClass(TempDict):
             except:
                 pass
 
+    def set(self, key, item):
+        TempDict.set(self, key, item)
+        self.save(item)
+
+    def save(self, token):
+        """
+        Propagates the changes of a token to the store
+        """
+        if self.store is not None:
+            self.store.set(u'token', token.id, token.get_shared_state(), self.get_timeout(), token.tid)
+
     def get(self, key):
         ret = TempDict.get(self, key)
+
+        if self.store is not None:
+            shared = self.store.get(u'token', key, self.get_timeout())
+            if shared is None:
+                # the token has been consumed or expired by another process;
+                # a token claimed by this process keeps its uploaded files
+                # until the claim is released or the token is deleted
+                if ret is not None and ret.claimed:
+                    raise errors.TokenFailure("Not found")
+
+                if ret is not None:
+                    self.delete(key)
+
+                ret = None
+            elif ret is None:
+                ret = Token.from_shared_state(shared)
+                TempDict.set(self, key, ret)
+            else:
+                # the files uploaded and the expiration timer are known
+                # only by the process that received the files and so are
+                # kept from the local token
+                ret.set_shared_state(shared)
+
         if ret is None:
             raise errors.TokenFailure("Not found")
 
         return ret
 
+    def claim(self, token):
+        """
+        Reserves a token for its final use; when the same token is claimed
+        concurrently, also by different processes, only one of them succeeds.
+
+        The token is then deleted after its use or released on failure.
+        """
+        if token.claimed or \
+           (self.store is not None and self.store.consume(u'token', token.id) is None):
+            raise errors.TokenFailure("Not found")
+
+        token.claimed = True
+
+    def release(self, token):
+        """
+        Releases the claim of a token that has not been used
+        """
+        token.claimed = False
+        self.save(token)
+
 
 TokenList = TokenListClass()
 
@@ -48,12 +110,16 @@ TokenList = TokenListClass()
 class Token(object):
     MAX_USES = 30
 
+    # attributes of the token shared with the other processes through the store
+    shared_attributes = ('tid', 'id', 'kind', 'remaining_uses', 'claimed', 'human_captcha', 'proof_of_work')
+
     def __init__(self, tid, token_kind="submission", uses=MAX_USES):
         self.tid = tid
         self.id = generateRandomKey(42)
         self.kind = token_kind
         self.remaining_uses = uses
         self.creation_date = datetime.utcnow()
+        self.claimed = False
 
         # Keeps track of the file uploaded associated
         self.uploaded_files = []
@@ -66,6 +132,25 @@ class Token(object):
 
         TokenList.set(self.id, self)
 
+    @classmethod
+    def from_shared_state(cls, state):
+        token = cls.__new__(cls)
+        token.expireCall = None
+        token.uploaded_files = []
+        token.set_shared_state(state)
+        return token
+
+    def get_shared_state(self):
+        state = {k: getattr(self, k) for k in self.shared_attributes}
+        state['creation_date'] = self.creation_date.strftime(DATETIME_FORMAT)
+        return state
+
+    def set_shared_state(self, state):
+        for k in self.shared_attributes:
+            setattr(self, k, state[k])
+
+        self.creation_date = datetime.strptime(state['creation_date'], DATETIME_FORMAT)
+
     def associate_file(self, fileinfo):
         self.uploaded_files.append(fileinfo)
 
@@ -183,6 +268,8 @@ class Token(object):
             if not self.proof_of_work['solved']:
                 self.generate_proof_of_work()
 
+        TokenList.save(self)
+
         return self.human_captcha['solved'] and self.proof_of_work['solved']
 
     def use(self):
@@ -194,9 +281,13 @@ class Token(object):
             TokenList.delete(self.id)
             raise e
 
+        TokenList.save(self)
+
         if not self.human_captcha['solved'] or not self.proof_of_work['solved']:
             raise errors.TokenFailure("Token is not solved")
 
     def solve(self):
         self.human_captcha = {'solved': True}
         self.proof_of_work = {'solved': True}
+
+        TokenList.save(self)
@@ -17,8 +17,20 @@ from six import text_type
 __all__ = ["ZipStream"]
 
 ZIP64_LIMIT= (1 << 31) - 1
+ZIP_FILECOUNT_LIMIT = (1 << 16) - 1
+ZIP_STORED = 0
 ZIP_DEFLATED = 8
 
+# Extensions of contents that are already compressed or encrypted and that
+# would only waste CPU if deflated again; these are added in stored mode.
+STORED_EXTENSIONS = frozenset([
+    '.pgp', '.gpg', '.asc', '.aes',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.mp3', '.mp4', '.m4a', '.ogg', '.webm', '.avi', '.mkv', '.mov',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp'
+])
+
 # Here are some struct module formats for reading headers
 structEndArchive = b"<4s4H2lH"     # 9 items, end of archive, 22 bytes
 stringEndArchive = b"PK\005\006"   # magic number for end of archive record
@@ -138,9 +150,12 @@ class ZipInfo(object):
         return header + filename + extra
 
 class ZipStream(object):
-    def __init__(self, files):
+    def __init__(self, files, open_file=None):
         self.files = files
 
+        # Function used to open the files specified by their path
+        self.open_file = open_file or (lambda path: open(path, 'rb'))
+
         self.filelist = []  # List of ZipInfo instances for archive
         self.data_ptr = 0   # Keep track of location inside archive
 
@@ -158,11 +173,26 @@ class ZipStream(object):
         self.data_ptr += len(data)
         return data
 
+    def compress_type_for(self, arcname):
+        """
+        Returns the compression method to be used for the given entry,
+        skipping deflate for content that is already compressed or encrypted
+        """
+        if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            return ZIP_STORED
+
+        return ZIP_DEFLATED
+
     def zipinfo_open(self, arcname):
-        zinfo = ZipInfo(arcname, self.time, ZIP_DEFLATED)
+        compress_type = self.compress_type_for(arcname)
+
+        zinfo = ZipInfo(arcname, self.time, compress_type)
         zinfo.header_offset = self.data_ptr
 
-        cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        if compress_type == ZIP_DEFLATED:
+            cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        else:
+            cmpr = None
 
         header = zinfo.FileHeader()
 
@@ -176,7 +206,9 @@ class ZipStream(object):
         zinfo.file_size += len(chunk)
         zinfo.CRC = binascii.crc32(chunk, zinfo.CRC) & 0xffffffff
 
-        chunk = cmpr.compress(chunk)
+        if cmpr is not None:
+            chunk = cmpr.compress(chunk)
+
         zinfo.compress_size += len(chunk)
 
         self.update_data_ptr(chunk)
@@ -184,7 +216,7 @@ class ZipStream(object):
         return chunk
 
     def zipinfo_close(self, zinfo, cmpr):
-        buf = cmpr.flush()
+        buf = cmpr.flush() if cmpr is not None else b''
         zinfo.compress_size += len(buf)
         self.update_data_ptr(buf)
 
@@ -209,7 +241,7 @@ class ZipStream(object):
         yield self.zipinfo_close(zipinfo, cmpr)
 
     def zip_file(self, filepath, arcname):
-        return self.zip_fo(open(filepath, "rb"), arcname)
+        return self.zip_fo(self.open_file(filepath), arcname)
 
     def archive_footer(self):
         """
@@ -278,7 +310,7 @@ class ZipStream(object):
 
         pos2 = self.data_ptr
         # Write end-of-zip-archive record
-        if pos1 > ZIP64_LIMIT:
+        if count > ZIP_FILECOUNT_LIMIT or pos1 > ZIP64_LIMIT or pos2 - pos1 > ZIP64_LIMIT:
             # Need to write the ZIP64 end-of-archive records
             zip64endrec = struct.pack(structEndArchive64, stringEndArchive64,
                                       44, 45, 45, 0, 0, count, count, pos2 - pos1, pos1)
@@ -289,7 +321,10 @@ class ZipStream(object):
             data.append(self.update_data_ptr(zip64locrec))
 
             endrec = struct.pack(structEndArchive, stringEndArchive,
-                                 0, 0, count, count, pos2 - pos1, -1, 0)
+                                 0, 0,
+                                 min(count, ZIP_FILECOUNT_LIMIT), min(count, ZIP_FILECOUNT_LIMIT),
+                                 pos2 - pos1 if pos2 - pos1 <= ZIP64_LIMIT else -1,
+                                 -1, 0)
             data.append(self.update_data_ptr(endrec))
 
         else:
@@ -5,22 +5,75 @@ import signal
 import sys
 import traceback
 
-from twisted.internet import defer, reactor
+from twisted.internet import defer, reactor, stdio
 from twisted.internet.protocol import ProcessProtocol
+from twisted.protocols.basic import LineOnlyReceiver
 
 from globaleaks.utils.process import set_proc_title, set_pdeathsig
 from globaleaks.utils.log import log
 
 
+def read_cfg(fd, bufsize=65536):
+    """
+    Reads the configuration sent by the supervisor on its first line;
+    returns it together with the data read after it, that is the beginning
+    of the messages sent on persistent channels
+    """
+    chunks = []
+    while True:
+        chunk = os.read(fd, bufsize)
+        if not chunk:
+            return json.loads(b''.join(chunks).decode()), b''
+
+        if b'\n' in chunk:
+            chunk, rest = chunk.split(b'\n', 1)
+            chunks.append(chunk)
+            return json.loads(b''.join(chunks).decode()), rest
+
+        chunks.append(chunk)
+
+
+class ChannelProtocol(LineOnlyReceiver):
+    """
+    Line delimited JSON channel used to exchange messages with the supervisor
+    """
+    delimiter = b'\n'
+    MAX_LENGTH = 1024 * 1024
+
+    def __init__(self, process):
+        self.process = process
+
+    def lineReceived(self, line):
+        self.process.handle_message(json.loads(line.decode()))
+
+    def send(self, message):
+        self.sendLine(json.dumps(message).encode())
+
+
 class Process(object):
     cfg = {}
     name = ''
 
-    def __init__(self, fd=42):
+    # Channel with the supervisor; the supervisor enables it in the
+    # configuration of the processes that keep the configuration file
+    # descriptor open in order to receive messages and send theirs on channel_fd
+    channel = None
+
+    def __init__(self, fd=42, channel_fd=43):
         self.pid = os.getpid()
 
-        with os.fdopen(fd, 'r') as f:
-            self.cfg = json.loads(f.read())
+        self.cfg, data = read_cfg(fd)
+
+        if self.cfg.get('channel', False):
+            self.channel = ChannelProtocol(self)
+            stdio.StandardIO(self.channel, stdin=fd, stdout=channel_fd)
+
+            # the messages received together with the configuration are
+            # handled once the process has been initialized
+            if data:
+                reactor.callWhenRunning(self.channel.dataReceived, data)
+        else:
+            os.close(fd)
 
         self._log = os.fdopen(0, 'w', 1).write
 
@@ -53,6 +106,9 @@ class Process(object):
     def sigusr2(self):
         pass
 
+    def handle_message(self, message):
+        pass
+
     def shutdown(self):
         pass
 
@@ -62,9 +118,11 @@ class Process(object):
 
 
 class CfgFDProcProtocol(ProcessProtocol):
+    persistent = False
+
     def __init__(self, supervisor, cfg, cfg_fd=42):
         self.supervisor = supervisor
-        self.cfg = json.dumps(cfg)
+        self.cfg = json.dumps(dict(cfg, channel=self.persistent))
         self.cfg_fd = cfg_fd
 
         self.fd_map = {0:'r', cfg_fd:'w'}
@@ -72,8 +130,10 @@ class CfgFDProcProtocol(ProcessProtocol):
         self.startup_promise = defer.Deferred()
 
     def connectionMade(self):
-        self.transport.writeToChild(self.cfg_fd, self.cfg.encode())
-        self.transport.closeChildFD(self.cfg_fd)
+        self.transport.writeToChild(self.cfg_fd, self.cfg.encode() + b'\n')
+
+        if not self.persistent:
+            self.transport.closeChildFD(self.cfg_fd)
 
         self.startup_promise.callback(None)
 
@@ -89,9 +149,42 @@ class CfgFDProcProtocol(ProcessProtocol):
         return "<%s: %s:%s>" % (self.__class__.__name__, id(self), self.transport)
 
 
-class HTTPSProcProtocol(CfgFDProcProtocol):
-    def __init__(self, supervisor, cfg, cfg_fd=42):
+class ChannelProcProtocol(CfgFDProcProtocol):
+    """
+    Protocol of the processes that keep the configuration file descriptor
+    open to receive messages from the supervisor and send theirs on channel_fd
+    """
+    persistent = True
+
+    def __init__(self, supervisor, cfg, cfg_fd=42, channel_fd=43):
         CfgFDProcProtocol.__init__(self, supervisor, cfg, cfg_fd)
 
+        self.channel_fd = channel_fd
+        self.fd_map[channel_fd] = 'r'
+        self.buffer = b''
+
+    def childDataReceived(self, childFD, data):
+        if childFD != self.channel_fd:
+            return CfgFDProcProtocol.childDataReceived(self, childFD, data)
+
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+
+        for line in lines:
+            if line:
+                self.supervisor.handle_worker_message(self, json.loads(line.decode()))
+
+    def send(self, message):
+        self.transport.writeToChild(self.cfg_fd, json.dumps(message).encode() + b'\n')
+
+
+class HTTPSProcProtocol(ChannelProcProtocol):
+    def __init__(self, supervisor, cfg, cfg_fd=42, channel_fd=43):
+        ChannelProcProtocol.__init__(self, supervisor, cfg, cfg_fd, channel_fd)
+
+        # fired with True when the worker reports to be listening on its
+        # sockets or with False if it exits before
+        self.ready = defer.Deferred()
+
         for tls_socket_fd in cfg['tls_socket_fds']:
             self.fd_map[tls_socket_fd] = tls_socket_fd
@@ -8,18 +8,30 @@ from sys import executable
 from globaleaks.handlers.admin.https import load_tls_dict_list
 from globaleaks.models.config import ConfigFactory
 from globaleaks.orm import transact
+from globaleaks.settings import Settings
 from globaleaks.utils import tls
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
 from globaleaks.utils.log import log
 from globaleaks.workers.process import HTTPSProcProtocol
-from twisted.internet import defer, reactor
+from twisted.internet import defer, reactor, task
 
 
 class ProcessSupervisor(object):
     """
     A supervisor for all subprocesses that the main globaleaks process can launch
     """
-    def __init__(self, net_sockets, proxy_ip, proxy_port):
+    # Thresholds of the average load of the HTTPS workers, as fraction of
+    # a CPU and as active client connections per worker, above which a
+    # worker is added and below which a worker is drained
+    cpu_high = 0.7
+    cpu_low = 0.2
+    connections_high = 512
+    connections_low = 32
+
+    # Number of consecutive evaluations of low load required to drain a worker
+    scale_down_checks = 6
+
+    def __init__(self, net_sockets, proxy_ip, proxy_port, unix_socket=None):
         log.info("Starting process monitor")
 
         self.shutting_down = False
@@ -28,28 +40,61 @@ class ProcessSupervisor(object):
         self.tls_process_pool = []
         self.cpu_count = multiprocessing.cpu_count()
 
+        # The number of HTTPS workers is adapted to their load between
+        # https_workers_min and https_workers_max; by default one worker
+        # per CPU is launched as long as the maximum allows it
+        self.https_workers_max = Settings.https_workers_max or self.cpu_count
+        self.https_workers_min = Settings.https_workers_min or min(self.cpu_count, self.https_workers_max)
+        self.https_workers_max = max(self.https_workers_max, self.https_workers_min)
+        self.https_workers = self.https_workers_min
+        self.low_load_checks = 0
+        self.scaler = task.LoopingCall(self.scale_https_workers)
+
         self.worker_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'worker_https.py')
 
         self.tls_cfg = {
           'proxy_ip': proxy_ip,
           'proxy_port': proxy_port,
+          'proxy_socket': unix_socket.getsockname() if unix_socket is not None else None,
+          'proxy_pool_max_connections': Settings.proxy_pool_max_connections,
+          'proxy_pool_idle_timeout': Settings.proxy_pool_idle_timeout,
+          'proxy_pool_stats_interval': Settings.proxy_pool_stats_interval,
+          'sni_cache_size': Settings.sni_cache_size,
+          'tls_session_timeout': Settings.tls_session_timeout,
+          'client_path': Settings.client_path,
+          'static_cache_size': Settings.static_cache_size,
+          'http2': Settings.http2,
           'debug': log.loglevel <= logging.DEBUG,
           'site_cfgs': [],
         }
 
+        # The last statistics of the connection pool of each HTTPS worker
+        self.proxy_pool_stats = {}
+
+        # The fraction of CPU used by each HTTPS worker between its last reports
+        self.cpu_usage = {}
+
+        # The progress of the last reload of the HTTPS workers
+        self.reload_status = {'state': 'idle', 'replaced': 0, 'total': 0}
+
         if not net_sockets:
             log.err("No ports to bind to! Spawning processes will not work!")
 
         self.tls_cfg['tls_socket_fds'] = [ns.fileno() for ns in net_sockets]
 
-    def db_maybe_launch_https_workers(self, session):
+    def db_load_site_cfgs(self, session):
+        """
+        Returns the valid TLS configurations of the sites, or None if HTTPS
+        is not enabled on the root tenant, and the last validation error;
+        the first configuration is used as default
+        """
         config = ConfigFactory(session, 1, 'node')
 
         # If root_tenant is disabled do not start https
         on = config.get_val(u'https_enabled')
         if not on:
             log.info("Not launching workers")
-            return defer.succeed(None)
+            return None, None
 
         site_cfgs = load_tls_dict_list(session)
 
@@ -61,19 +106,82 @@ class ProcessSupervisor(object):
             if ok and err is None:
                 valid_cfgs.append(db_cfg)
 
+        return valid_cfgs, err
+
+    @defer.inlineCallbacks
+    def maybe_launch_https_workers(self):
+        """
+        Launches the HTTPS workers if HTTPS is enabled; the configurations
+        are loaded in a transaction while the workers are spawned from the
+        reactor thread once it has been committed
+        """
+        valid_cfgs, err = yield self.load_site_cfgs()
+        if valid_cfgs is None:
+            return
+
         self.tls_cfg['site_cfgs'] = valid_cfgs
 
         if not valid_cfgs:
             log.info("Not launching https workers due to %s", err)
-            return defer.fail(err)
+            return
 
         log.info("Decided to launch https workers")
 
-        return self.launch_https_workers()
+        yield self.launch_https_workers()
 
     @transact
-    def maybe_launch_https_workers(self, session):
-        self.db_maybe_launch_https_workers(session)
+    def load_site_cfgs(self, session):
+        return self.db_load_site_cfgs(session)
+
+    @defer.inlineCallbacks
+    def update_https_workers(self):
+        """
+        Applies the changes of the TLS configurations of the sites to the
+        running HTTPS workers without restarting them; the workers are
+        started or stopped only when HTTPS is enabled or disabled
+        """
+        if not self.is_running():
+            yield self.maybe_launch_https_workers()
+            return
+
+        valid_cfgs, _ = yield self.load_site_cfgs()
+        if not valid_cfgs:
+            self.tls_cfg['site_cfgs'] = []
+            self.shutdown()
+            return
+
+        messages = self.get_site_messages(self.tls_cfg['site_cfgs'], valid_cfgs)
+
+        # the workers launched from now on receive the new configuration
+        self.tls_cfg['site_cfgs'] = valid_cfgs
+
+        for pp in self.tls_process_pool:
+            for message in messages:
+                pp.send(message)
+
+    def get_site_messages(self, old_cfgs, new_cfgs):
+        """
+        Returns the messages that update the sites of a HTTPS worker
+        configured with old_cfgs to new_cfgs
+        """
+        messages = []
+
+        if not old_cfgs or old_cfgs[0] != new_cfgs[0]:
+            messages.append({'type': 'update_site', 'default': True, 'site_cfg': new_cfgs[0]})
+
+        old_sites = {cfg['hostname']: cfg for cfg in old_cfgs[1:]}
+        new_sites = {cfg['hostname']: cfg for cfg in new_cfgs[1:]}
+
+        for hostname in sorted(set(old_sites) - set(new_sites)):
+            messages.append({'type': 'remove_site', 'hostname': hostname})
+
+        for hostname in sorted(new_sites):
+            if hostname not in old_sites:
+                messages.append({'type': 'add_site', 'site_cfg': new_sites[hostname]})
+            elif new_sites[hostname] != old_sites[hostname]:
+                messages.append({'type': 'update_site', 'site_cfg': new_sites[hostname]})
+
+        return messages
 
     def launch_worker(self):
         pp = HTTPSProcProtocol(self, self.tls_cfg)
@@ -85,19 +193,100 @@ class ProcessSupervisor(object):
         return pp.startup_promise
 
     def launch_https_workers(self):
-        return defer.DeferredList([self.launch_worker() for _ in range(self.cpu_count)])
+        self.shutting_down = False
+
+        if not self.scaler.running:
+            self.scaler.start(Settings.proxy_pool_stats_interval, now=False)
+
+        return defer.DeferredList([self.launch_worker() for _ in range(self.https_workers - len(self.tls_process_pool))])
+
+    def drain_worker(self, pp=None):
+        """
+        Removes a HTTPS worker, by default the last launched, from the pool;
+        the worker stops accepting new connections and exits once the
+        active ones have been served
+        """
+        if pp is None:
+            pp = self.tls_process_pool[-1]
+
+        self.tls_process_pool.remove(pp)
+        self.proxy_pool_stats.pop(pp, None)
+        self.cpu_usage.pop(pp, None)
+
+        try:
+            pp.transport.signalProcess(signal.SIGUSR2)
+        except OSError as e:
+            log.debug('Tried to signal: %d got: %s', pp.transport.pid, e)
+
+    def scale_https_workers(self):
+        """
+        Adds a HTTPS worker when the average load of the workers is high and
+        drains one when the load has been low for scale_down_checks evaluations
+        """
+        usages = [self.cpu_usage[pp] for pp in self.tls_process_pool if pp in self.cpu_usage]
+        if self.shutting_down or self.reload_status['state'] == 'running' or not usages:
+            return
+
+        cpu = sum(usages) / len(usages)
+        connections = sum(self.proxy_pool_stats[pp].get('active_connections', 0)
+                          for pp in self.tls_process_pool if pp in self.proxy_pool_stats) / float(len(usages))
+
+        if (cpu > self.cpu_high or connections > self.connections_high) and \
+           self.https_workers < self.https_workers_max:
+            self.low_load_checks = 0
+            self.https_workers += 1
+            log.info("Adding a HTTPS worker (cpu: %.2f, connections: %.1f)", cpu, connections)
+            self.launch_worker()
+
+        elif cpu < self.cpu_low and connections < self.connections_low and \
+             self.https_workers > self.https_workers_min:
+            self.low_load_checks += 1
+            if self.low_load_checks >= self.scale_down_checks:
+                self.low_load_checks = 0
+                self.https_workers -= 1
+                log.info("Draining a HTTPS worker (cpu: %.2f, connections: %.1f)", cpu, connections)
+                self.drain_worker()
+
+        else:
+            self.low_load_checks = 0
 
     def should_spawn_child(self):
-        return not self.shutting_down and len(self.tls_process_pool) < self.cpu_count
+        return not self.shutting_down and len(self.tls_process_pool) < self.https_workers
 
     def is_running(self):
         return len(self.tls_process_pool) > 0
 
+    def handle_worker_message(self, pp, message):
+        """
+        Handles a message sent by a HTTPS worker on its channel
+        """
+        log.debug("Subprocess: %s sent: %s", pp, message)
+
+        if message['type'] == 'ready':
+            if not pp.ready.called:
+                pp.ready.callback(True)
+
+            return
+
+        if message['type'] == 'proxy_pool_stats':
+            stats = message['stats']
+            last = self.proxy_pool_stats.get(pp)
+            if last is not None and 'cpu_time' in last and 'cpu_time' in stats and stats['time'] > last['time']:
+                self.cpu_usage[pp] = float(stats['cpu_time'] - last['cpu_time']) / (stats['time'] - last['time'])
+
+            self.proxy_pool_stats[pp] = stats
+
     def handle_worker_death(self, pp, reason):
         log.debug("Subprocess: %s exited with: %s", pp, reason)
 
         if pp in self.tls_process_pool: self.tls_process_pool.remove(pp)
 
+        if not pp.ready.called:
+            pp.ready.callback(False)
+
+        self.proxy_pool_stats.pop(pp, None)
+        self.cpu_usage.pop(pp, None)
+
         if self.should_spawn_child():
             self.launch_worker()
 
@@ -109,28 +298,88 @@ class ProcessSupervisor(object):
         else:
             msg = "Nothing is being served"
 
+        proxy_pool = {'requests': 0, 'connections': 0, 'idle_connections': 0, 'static_requests': 0}
+        for stats in self.proxy_pool_stats.values():
+            for k in proxy_pool:
+                proxy_pool[k] += stats.get(k, 0)
+
+        tls_sessions = {'accepts': 0, 'hits': 0, 'misses': 0, 'sessions': 0}
+        for stats in self.proxy_pool_stats.values():
+            for k in tls_sessions:
+                tls_sessions[k] += stats.get('tls_sessions', {}).get(k, 0)
+
         return {
             'timestamp': datetime_to_ISO8601(datetime_now()),
-            'msg': msg
+            'msg': msg,
+            'proxy_pool': proxy_pool,
+            'tls_sessions': tls_sessions,
+            'https_workers': {'running': len(self.tls_process_pool),
+                              'min': self.https_workers_min,
+                              'max': self.https_workers_max,
+                              'reload': self.reload_status},
+            # bytes of the proxied responses kept in memory by each HTTPS worker
+            'proxy_buffered_bytes': [stats.get('buffered_bytes', 0) for stats in self.proxy_pool_stats.values()]
         }
 
+    @defer.inlineCallbacks
     def reload(self):
+        """
+        Replaces the HTTPS workers https_reload_batch_size at a time; each
+        batch of workers is drained only once its replacements have reported
+        to be ready in order to keep the capacity during the reload
+        """
+        if self.reload_status['state'] == 'running':
+            return
+
         log.debug('Reloading HTTPS configuration')
 
-        while self.tls_process_pool:
-            try:
-                pp = self.tls_process_pool.pop(0)
-                pp.transport.signalProcess(signal.SIGUSR2)
-            except OSError as e:
-                log.debug('Tried to signal: %d got: %s', pp.transport.pid, e)
+        old_workers = list(self.tls_process_pool)
 
-        self.launch_https_workers()
+        self.reload_status = {'state': 'running', 'replaced': 0, 'total': len(old_workers)}
+
+        batch_size = Settings.https_reload_batch_size
+
+        for i in range(0, len(old_workers), batch_size):
+            if self.shutting_down:
+                self.reload_status['state'] = 'aborted'
+                return
+
+            batch = [pp for pp in old_workers[i:i + batch_size] if pp in self.tls_process_pool]
+
+            new_workers = []
+            for _ in batch:
+                self.launch_worker()
+                new_workers.append(self.tls_process_pool[-1])
+
+            results = yield defer.DeferredList([pp.ready.addTimeout(Settings.https_reload_ready_timeout, reactor)
+                                                for pp in new_workers], consumeErrors=True)
+
+            if not all(success and ready for success, ready in results):
+                log.err('Aborting the reload of the HTTPS workers: the new workers are not ready')
+
+                for pp in new_workers:
+                    if pp in self.tls_process_pool:
+                        self.drain_worker(pp)
+
+                self.reload_status['state'] = 'failed'
+                return
+
+            for pp in batch:
+                if pp in self.tls_process_pool:
+                    self.drain_worker(pp)
+
+            self.reload_status['replaced'] += len(batch)
+
+        self.reload_status['state'] = 'done'
 
     def shutdown(self):
         log.debug('Starting HTTPS workes shutdown')
 
         self.shutting_down = True
 
+        if self.scaler.running:
+            self.scaler.stop()
+
         while self.tls_process_pool:
             try:
                 pp = self.tls_process_pool.pop(0)
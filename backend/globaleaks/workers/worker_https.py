@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
+import resource
 import sys
+import time
 
 if os.path.dirname(__file__) != '/usr/lib/python2.7/dist-packages/globaleaks/workers':
     sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
@@ -12,16 +14,18 @@ from twisted.internet.task import LoopingCall
 from globaleaks.workers.process import Process
 from globaleaks.utils.sock import listen_tls_on_sock
 from globaleaks.utils.sni import SNIMap
-from globaleaks.utils.tls import TLSServerContextFactory, ChainValidator
+from globaleaks.utils.staticcache import StaticFileCache
+from globaleaks.utils.tls import TLSServerContextFactory, ChainValidator, get_session_cache_stats
 from globaleaks.utils.httpsproxy import HTTPStreamFactory
 from globaleaks.utils.utility import datetime_now
 
 
-def make_TLSContextFactory(site_cfg):
+def make_TLSContextFactory(site_cfg, session_timeout=300):
     return TLSServerContextFactory(site_cfg['ssl_key'],
                                    site_cfg['ssl_cert'],
                                    site_cfg['ssl_intermediate'],
-                                   site_cfg['ssl_dh'])
+                                   site_cfg['ssl_dh'],
+                                   session_timeout)
 
 
 class HTTPSProcess(Process):
@@ -33,21 +37,39 @@ class HTTPSProcess(Process):
 
         proxy_url = 'http://' + self.cfg['proxy_ip'] + ':' + str(self.cfg['proxy_port'])
 
-        self.http_proxy_factory = HTTPStreamFactory(proxy_url)
+        static_cache = None
+        if self.cfg.get('client_path') and self.cfg.get('static_cache_size'):
+            static_cache = StaticFileCache(self.cfg['client_path'], self.cfg['static_cache_size'])
+            self.log("Cached %d files of the client (%d bytes)" % (len(static_cache.entries), static_cache.size))
 
-        for site_cfg in self.cfg['site_cfgs']:
-            cv = ChainValidator()
-            ok, err = cv.validate(site_cfg, must_be_disabled=False, check_expiration=False)
-            if not ok or not err is None:
-                raise err
+        self.http_proxy_factory = HTTPStreamFactory(proxy_url,
+                                                    self.cfg.get('proxy_pool_persistent', True),
+                                                    self.cfg.get('proxy_pool_max_connections', 16),
+                                                    self.cfg.get('proxy_pool_idle_timeout', 60),
+                                                    self.cfg.get('proxy_socket'),
+                                                    static_cache,
+                                                    self.cfg.get('http2', False))
+
+        self.stats_reporter = None
+        if self.channel is not None:
+            self.stats_reporter = LoopingCall(self.report_stats)
+            self.stats_reporter.start(self.cfg.get('proxy_pool_stats_interval', 60), now=False)
 
         default_site = self.cfg['site_cfgs'].pop(0)
-        sni_dict = {'DEFAULT': make_TLSContextFactory(default_site)}
+        sni_dict = {'DEFAULT': default_site}
 
         for site_cfg in self.cfg['site_cfgs']:
-            sni_dict[site_cfg['hostname']] = make_TLSContextFactory(site_cfg)
+            sni_dict[site_cfg['hostname']] = site_cfg
 
-        self.snimap = SNIMap(sni_dict)
+        protocols = None
+        if self.http_proxy_factory.http2:
+            protocols = [b'h2', b'http/1.1']
+        elif self.cfg.get('http2', False):
+            self.log("HTTP/2 is not available as the h2 library is not installed")
+
+        # the contexts of the sites are built on the first handshake
+        # for their hostname; only the DEFAULT one is built at startup
+        self.snimap = SNIMap(sni_dict, self.build_tls_context, self.cfg.get('sni_cache_size', 256), protocols)
 
         for socket_fd in self.cfg['tls_socket_fds']:
             self.log("Opening socket: %d : %s" % (socket_fd, os.fstat(socket_fd)))
@@ -58,8 +80,57 @@ class HTTPSProcess(Process):
                                       factory=self.http_proxy_factory)
 
             self.ports.append(port)
-            self.log("HTTPS proxy listening on {} for hostnames: {}".format(
-                     port._realPortNumber, ', '.join(sni_dict.keys())))
+            self.log("HTTPS proxy listening on {} for {} hostnames".format(
+                     port._realPortNumber, len(sni_dict)))
+
+        if self.channel is not None:
+            self.channel.send({'type': 'ready'})
+
+    def build_tls_context(self, site_cfg):
+        cv = ChainValidator()
+        ok, err = cv.validate(site_cfg, must_be_disabled=False, check_expiration=False)
+        if not ok or not err is None:
+            self.log("Invalid TLS configuration for %s: %s" % (site_cfg.get('hostname', 'DEFAULT'), err))
+            raise err
+
+        return make_TLSContextFactory(site_cfg, self.cfg.get('tls_session_timeout', 300))
+
+    def handle_message(self, message):
+        """
+        Applies the changes of the sites sent by the supervisor
+        """
+        if message['type'] in ('add_site', 'update_site'):
+            site_cfg = message['site_cfg']
+
+            if message.get('default', False):
+                try:
+                    self.snimap.setDefault(site_cfg)
+                except Exception:
+                    # the previous DEFAULT context is kept
+                    return
+            else:
+                self.snimap.setSite(site_cfg['hostname'], site_cfg)
+
+            self.log("Updated TLS configuration for %s" % site_cfg['hostname'])
+
+        elif message['type'] == 'remove_site':
+            self.snimap.removeSite(message['hostname'])
+
+            self.log("Removed TLS configuration for %s" % message['hostname'])
+
+    def report_stats(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+
+        stats = self.http_proxy_factory.get_stats()
+        stats['time'] = time.time()
+        stats['cpu_time'] = usage.ru_utime + usage.ru_stime
+        stats['tls_contexts'] = len(self.snimap.contexts)
+        stats['tls_contexts_build_time'] = sum(self.snimap.build_times.values())
+
+        # the sessions of all the sites are cached by the DEFAULT context
+        stats['tls_sessions'] = get_session_cache_stats(self.snimap.context)
+
+        self.channel.send({'type': 'proxy_pool_stats', 'stats': stats})
 
     def sigusr1(self):
         self.shutdown()
@@ -81,6 +152,9 @@ class HTTPSProcess(Process):
         reactor.callFromThread(_sigusr2)
 
     def shutdown(self):
+        if self.stats_reporter is not None and self.stats_reporter.running:
+            self.stats_reporter.stop()
+
         for port in self.ports:
             port.connectionLost(None)
 
@@ -32,6 +32,9 @@ setup(
     package_dir={'globaleaks': 'globaleaks'},
     test_suite='globaleaks.tests',
     packages=find_packages(exclude=['*.tests', '*.tests.*']),
+    extras_require={
+        'http2': ['h2>=3.0,<4.0', 'priority>=1.1,<2.0']
+    },
     scripts=[
         'bin/globaleaks',
         'bin/gl-admin',